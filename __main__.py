@@ -1,50 +1,498 @@
+import argparse
+import json
+import math
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from functools import partial
 from pathlib import Path
-from .terraform_fmt import terraform_fmt
-from .heredoc_fmt import convert_to_indented_heredoc, align_heredoc_closing_delimited
-from .custom_fmt import reorder_resource_properties, align_key_value_pairs
+from typing import Optional
+from .terraform_fmt import BACKENDS, DEFAULT_BACKEND, DEFAULT_CHUNK_SIZE, compare_backends
+from .check import DEFAULT_CHECK_TARGET
+from .hcl_parser import split_lines
+from .range_fmt import apply_edits, format_selection
+from .daemon import DEFAULT_POLL_INTERVAL, DEFAULT_SOCKET, FormatDaemon, run_daemon, send_request
+from .discovery import DEFAULT_WALKERS, DISCOVERY_BATCH_SIZE, discover_inputs, stream_batches
+from .shard import DEFAULT_SHARD_MANIFEST, default_bundle_path, merge_bundles, parse_shard, select_shard, write_bundle
+from .cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE_MB, ResultCache, formatter_fingerprint
+from .incremental import git_changed_files, is_changed, load_manifest, save_manifest
+from .pipeline import STAGES, build_stages, run_pipeline
+from .resource_index import DEFAULT_INDEX, INDEX_KEYS, ResourceIndex
+from .instrumentation import print_profile, write_chrome_trace, write_profile_json
+from .runner import FileReport, RunOptions, check_files, format_batch, format_mapped_files, format_streamed
+from .streaming import DEFAULT_STREAM_CHUNK_BYTES
+from .verify import VerificationError, verify_text
 
 
-def main():
-    print("Begin formatting...")
+def parse_range(value: str) -> tuple:
+    start, separator, end = value.partition(":")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"expected START:END, got {value!r}")
+    return int(start), int(end)
+
+
+def shard_arg(value: str) -> tuple:
+    try:
+        return parse_shard(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def index_query(value: str) -> tuple:
+    key, separator, query = value.partition("=")
+    if not separator or key not in INDEX_KEYS:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE with KEY one of {', '.join(INDEX_KEYS)}, got {value!r}")
+    return key, query
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Format the Terraform files in `unformatted/` into `formatted/`.")
+    parser.add_argument("files", nargs="*", type=Path,
+                        help="format only these files instead of every .tf file in `unformatted/`")
+    parser.add_argument("--since", metavar="REVISION",
+                        help="format only files changed in a git revision (range), e.g. HEAD or origin/main..HEAD")
+    parser.add_argument("--manifest", type=Path,
+                        help="mtime/size manifest from the previous run; only files changed since then are formatted")
+    parser.add_argument("--recursive", "-r", action="store_true",
+                        help="format the .tf files in all sub-directories of `unformatted/` (or of the given "
+                             "directories); outputs mirror the directory layout")
+    parser.add_argument("--exclude", action="append", default=[], metavar="PATTERN",
+                        help="with --recursive, skip paths matching this .gitignore-style pattern (repeatable); "
+                             ".gitignore files are honoured and .terraform directories always skipped")
+    parser.add_argument("--walkers", type=int, default=DEFAULT_WALKERS,
+                        help="with --recursive, number of threads listing directories concurrently")
+    parser.add_argument("--shard", type=shard_arg, metavar="I/N",
+                        help="format only the I-th of N size-balanced parts of the files and write them to a bundle "
+                             "(run N such processes, e.g. on N CI runners, then --merge the bundles)")
+    parser.add_argument("--shard-manifest", type=Path, default=Path(DEFAULT_SHARD_MANIFEST),
+                        help="partition of the files into shards; computed and saved here if missing or made for "
+                             "another shard count")
+    parser.add_argument("--bundle", type=Path,
+                        help="result bundle written by --shard (default: shard-I-of-N.json.gz)")
+    parser.add_argument("--merge", nargs="+", type=Path, metavar="BUNDLE",
+                        help="write the outputs of these shard bundles to `formatted/` and print the combined summary; "
+                             "with --index, also add the resources the shards indexed to the index")
+    parser.add_argument("--index", nargs="?", type=Path, const=Path(DEFAULT_INDEX), metavar="PATH",
+                        help="record the address, display_name, name and query hash of every resource formatted in "
+                             f"the resource index at PATH (default: {DEFAULT_INDEX}), updating it in place")
+    parser.add_argument("--find", type=index_query, metavar="KEY=VALUE",
+                        help="print the file and line of the resources whose address, display_name, name or query "
+                             "(hash) is VALUE, from the resource index; nothing is formatted")
+    parser.add_argument("--duplicates", action="store_true",
+                        help="print the addresses defined twice and the display names, names and queries shared by "
+                             "several resources, from the resource index; exit with 1 if there are any")
+    parser.add_argument("--emit-intermediates", action="store_true",
+                        help="also write the output of every intermediate stage (debugging aid)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="number of files formatted together (one `terraform fmt` process per batch)")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="number of worker processes formatting files in parallel")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always run the full pipeline instead of reusing cached results")
+    parser.add_argument("--cache-dir", type=Path, default=Path(DEFAULT_CACHE_DIR),
+                        help="directory holding the persistent result cache")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE_MB,
+                        help="cache size limit in MB; least recently used entries are evicted beyond it")
+    parser.add_argument("--fmt-backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="apply the `terraform fmt` rules natively (default) or via the `terraform` binary")
+    parser.add_argument("--compare-backends", action="store_true",
+                        help="format every file with both backends, print where they differ and write nothing")
+    parser.add_argument("--stream", action="store_true",
+                        help="read and write each file incrementally, block by block (for very large files)")
+    parser.add_argument("--stream-chunk-size", type=int, default=DEFAULT_STREAM_CHUNK_BYTES,
+                        help="bytes of source formatted together in streaming mode")
+    parser.add_argument("--mmap", action="store_true",
+                        help="read the files through a memory map and write each output as the original bytes plus "
+                             "the formatting edits, keeping line endings, the trailing newline and untouched bytes")
+    parser.add_argument("--check", action="store_true",
+                        help="write nothing; exit with 1 if any file would be reformatted (stops at the first change)")
+    parser.add_argument("--diff", action="store_true",
+                        help="like --check, but also print a unified diff of the blocks that would change")
+    parser.add_argument("--check-target", default=DEFAULT_CHECK_TARGET,
+                        help="stage whose output the files are checked against (and --lines/--bytes/--address produce)")
+    parser.add_argument("--lines", type=parse_range, metavar="START:END",
+                        help="format only the top-level blocks overlapping lines START to END (1-based, inclusive) "
+                             "of the one given file and print the edits as JSON; nothing is written")
+    parser.add_argument("--bytes", type=parse_range, metavar="START:END",
+                        help="like --lines, for the bytes [START, END) of the file (0-based UTF-8 offsets, the unit "
+                             "of start_byte / end_byte in the printed edits)")
+    parser.add_argument("--address",
+                        help="like --lines, for the block with this address, e.g. tfe_policy.example_sentinel_policy")
+    parser.add_argument("--daemon", action="store_true",
+                        help="format once, then keep reformatting files as they change and serve --client requests")
+    parser.add_argument("--client", action="store_true",
+                        help="send the files (or `-` for stdin, printed formatted to stdout) to a running daemon")
+    parser.add_argument("--socket", type=Path, default=Path(DEFAULT_SOCKET),
+                        help="Unix socket the daemon listens on")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="seconds between checks for changed files in daemon mode")
+    parser.add_argument("--no-verify", action="store_true",
+                        help="write outputs without checking that they only differ from the input in whitespace, "
+                             "attribute order and heredoc indentation")
+    parser.add_argument("--block-memo", action="store_true",
+                        help="format blocks that are identical apart from their names only once; only pays off "
+                             "when most blocks repeat, otherwise the placeholder bookkeeping makes runs slower")
+    parser.add_argument("--profile", action="store_true",
+                        help="record CPU, subprocess, size and heredoc metrics per stage and print them per file")
+    parser.add_argument("--profile-json", type=Path, metavar="PATH",
+                        help="write the per-file and aggregate stage metrics to PATH (implies --profile)")
+    parser.add_argument("--trace", type=Path, metavar="PATH",
+                        help="write the stage runs as a Chrome trace to PATH (implies --profile)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also record the peak memory of every stage with tracemalloc (slow, implies --profile)")
+    return parser.parse_args(argv)
+
+
+def print_stage_timings(totals: dict, file_count: int):
+    print(f"Stage timings over {file_count} file(s):")
+    for stage in STAGES:
+        print(f"  {stage.name:<35} {totals.get(stage.name, 0.0) * 1000:10.2f} ms")
+
+
+def split_batches(tf_files: list, batch_size: int, jobs: int) -> list:
+    # Keep every worker busy: never hand out fewer batches than there are workers
+    size = max(1, min(batch_size, math.ceil(len(tf_files) / max(jobs, 1))))
+    return [tf_files[start:start + size] for start in range(0, len(tf_files), size)]
+
+
+def compare_fmt_backends(tf_files: list) -> int:
+    """
+    Differential check of the native formatter against `terraform fmt` over `tf_files`.
+    """
+    source = next(stage.source for stage in STAGES if stage.name == "terraform_fmt")
+    fmt_inputs = [run_pipeline(tf_file.read_text(encoding="utf-8"), keep_intermediates=True).outputs[source]
+                  for tf_file in tf_files]
+    mismatches = 0
+    for tf_file, diff in zip(tf_files, compare_backends(fmt_inputs)):
+        if diff:
+            mismatches += 1
+            print(f"✘ {tf_file}: native formatter differs from `terraform fmt`")
+            print(diff)
+        else:
+            print(f"✔ {tf_file}")
+    print(f"{mismatches} of {len(tf_files)} file(s) differ between backends")
+    return 1 if mismatches else 0
+
+
+def report_check(batch_reports) -> int:
+    unformatted = 0
+    failures = 0
+    file_count = 0
+    for reports in batch_reports:
+        for report in reports:
+            print("\n".join(report.log))
+            file_count += 1
+            unformatted += report.unformatted
+            failures += report.error is not None
+    if failures:
+        print(f"✘ {failures} of {file_count} file(s) could not be checked")
+    if unformatted:
+        print(f"✘ {unformatted} of {file_count} file(s) would be reformatted")
+    else:
+        print(f"✔ All {file_count} file(s) are formatted")
+    return 1 if unformatted or failures else 0
+
+
+def run_client(args) -> int:
+    """
+    Hands the request over to the daemon listening on `--socket` and reports its answer like a local run would.
+    """
+    check = args.check or args.diff
+    if args.files == [Path("-")]:
+        content = sys.stdin.read()
+        response = send_request(args.socket, {"content": content, "target": args.check_target})
+        if "error" in response:
+            print(f"✘ {response['error']}", file=sys.stderr)
+            return 1
+        if check:
+            # Compared line by line like check_files, so a trailing newline alone does not count as a change
+            if split_lines(response["formatted"]) != split_lines(content):
+                print("✘ <stdin> would be reformatted")
+                return 1
+            print("✔ <stdin> is formatted")
+            return 0
+        sys.stdout.write(response["formatted"])
+        return 0
+
+    request = {"files": [str(tf_file.resolve()) for tf_file in args.files], "check": check, "diff": args.diff}
+    response = send_request(args.socket, request)
+    if "error" in response:
+        print(f"✘ {response['error']}")
+        return 1
+    reports = [FileReport(**report) for report in response["reports"]]
+    if check:
+        return report_check([reports])
+    for report in reports:
+        print("\n".join(report.log))
+    failures = [report for report in reports if report.error]
+    print(f"Daemon: {len(reports)} file(s) in {response['elapsed_ms']:.2f} ms")
+    if failures:
+        print(f"✘ {len(failures)} of {len(reports)} file(s) failed to format")
+        return 1
+    return 0
+
+
+def run_range(args) -> int:
+    """
+    Formats the part of one file selected by --lines, --bytes or --address and prints the edits
+    (see range_fmt.Edit) as JSON. Goes through the daemon with --client. Unless --no-verify is given, the
+    edits are only printed if the result is equivalent to the input (see verify.verify_equivalent).
+    """
+    if len(args.files) != 1:
+        print("✘ --lines, --bytes and --address take exactly one file (or `-` for stdin)", file=sys.stderr)
+        return 2
+    data = sys.stdin.buffer.read() if args.files[0] == Path("-") else args.files[0].read_bytes()
+    content = data.decode("utf-8")
+    selection = {"address": args.address}
+    if args.lines is not None:
+        selection["lines"] = (args.lines[0] - 1, args.lines[1])
+    if args.bytes is not None:
+        selection["bytes"] = args.bytes
+
+    if args.client:
+        response = send_request(args.socket, dict(selection, content=content, target=args.check_target))
+        if "error" in response:
+            print(f"✘ {response['error']}", file=sys.stderr)
+            return 1
+        edits = response["edits"]
+    else:
+        try:
+            edits = format_selection(content, selection.get("lines"), selection.get("bytes"), args.address,
+                                     build_stages(args.fmt_backend), args.check_target)
+            if not args.no_verify:
+                verify_text(content, apply_edits(content, edits), args.check_target)
+            edits = [asdict(edit) for edit in edits]
+        except (ValueError, VerificationError) as error:
+            print(f"✘ {error}", file=sys.stderr)
+            return 1
+    print(json.dumps(edits, indent=2))
+    return 0
+
+
+def run_merge(bundle_files: list, output_folder: Path, index_path: Optional[Path] = None) -> int:
+    """
+    Combines the bundles written by `--shard` runs into `output_folder` and prints the summary of the whole run.
+    With `index_path`, the resources indexed by the shards are added to the resource index there.
+    """
+    output_folder.mkdir(exist_ok=True)
+    try:
+        merged = merge_bundles(bundle_files, output_folder)
+    except (OSError, ValueError) as error:
+        print(f"✘ {error}")
+        return 1
+    totals = {}
+    cache_hits = 0
+    failures = [report for report in merged.reports if report["error"]]
+    for report in merged.reports:
+        cache_hits += report["cached"]
+        for stage_name, elapsed in report["timings"].items():
+            totals[stage_name] = totals.get(stage_name, 0.0) + elapsed
+    file_count = len(merged.reports)
+    print(f"Merged {len(bundle_files)} bundle(s) with {file_count} file(s)")
+    print_stage_timings(totals, file_count - len(failures) - cache_hits)
+    print(f"Outputs: {merged.modified} of {merged.outputs} file(s) modified")
+    if index_path is not None:
+        index = ResourceIndex.load(index_path)
+        index.merge(merged.index)
+        index.save(index_path)
+        print(f"Index: {len(merged.index)} file(s) indexed by the shards, {len(index.files)} in {index_path}")
+    if merged.missing:
+        print(f"✘ No bundle for shard(s) {', '.join(str(shard) for shard in merged.missing)}")
+    if failures:
+        print(f"✘ {len(failures)} of {file_count} file(s) failed to format:")
+        for report in failures:
+            print(f"  {report['name']}: {report['error']}")
+    return 1 if failures or merged.missing else 0
+
+
+def print_resources(resources: list):
+    for path, resource in resources:
+        print(f"  {resource.address}  {path}:{resource.line}")
+
+
+def list_inputs(args, input_folder: Path) -> list:
+    """
+    The input files selected by the command line, sorted: the given files or the `.tf` files of
+    `input_folder`, or everything discovered below them with --recursive.
+    """
+    if args.recursive:
+        return sorted(discover_inputs(args.files or [input_folder], args.exclude, args.walkers))
+    return sorted(args.files or input_folder.glob("*.tf"))
+
+
+def run_index_query(args, input_folder: Path) -> int:
+    """
+    Answers --find / --duplicates from the resource index, after re-indexing the input files that changed
+    since they were indexed (usually none, so no file is parsed).
+    """
+    index_path = args.index or Path(DEFAULT_INDEX)
+    tf_files = list_inputs(args, input_folder)
+    index = ResourceIndex.load(index_path)
+    parsed = index.refresh(tf_files)
+    index.save(index_path)
+    resources = index.resources()
+    print(f"Index: {len(resources)} resource(s) in {len(index.files)} file(s), {parsed} file(s) re-indexed")
+
+    if args.find is not None:
+        key, value = args.find
+        found = index.find(key, value)
+        if not found:
+            print(f"✘ No resource with {key} = {value!r}")
+            return 1
+        print(f"✔ {len(found)} resource(s) with {key} = {value!r}:")
+        print_resources(found)
+        return 0
+
+    duplicates = index.duplicates()
+    for key, value, group in duplicates:
+        shown = value if "\n" not in value and len(value) <= 60 else value[:57].split("\n")[0] + "..."
+        print(f"✘ {key} {shown!r} is shared by {len(group)} resources:")
+        print_resources(group)
+    if duplicates:
+        print(f"✘ {len(duplicates)} duplicate value(s) in {len(resources)} resource(s)")
+        return 1
+    print(f"✔ No duplicate addresses, display names, names or queries in {len(resources)} resource(s)")
+    return 0
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.lines is not None or args.bytes is not None or args.address is not None:
+        return run_range(args)
+    if args.client:
+        return run_client(args)
+    if args.merge:
+        return run_merge(args.merge, Path("formatted"), args.index)
+    if args.find is not None or args.duplicates:
+        return run_index_query(args, Path("unformatted"))
+    check = args.check or args.diff
+    print("Begin checking..." if check else "Begin formatting...")
     input_folder = Path("unformatted")
     output_folder = Path("formatted")
-    output_folder.mkdir(exist_ok=True)
+    if args.shard is not None and not check:
+        # A shard writes its outputs to a scratch folder, from which they are packed into its bundle
+        output_folder = Path(tempfile.mkdtemp(prefix="tf-shard-"))
+    if not check:
+        output_folder.mkdir(exist_ok=True)
+
+    # Recursive discovery streams the files into the workers while the walk goes on; the daemon and the
+    # backend comparison need the complete list up front
+    streamed = args.recursive and not (args.daemon or args.compare_backends or args.shard)
+    if streamed:
+        tf_files = discover_inputs(args.files or [input_folder], args.exclude, args.walkers)
+    else:
+        # The walker threads yield files as they find them; sorting keeps runs reproducible
+        tf_files = list_inputs(args, input_folder)
+    if args.since:
+        changed = set(path.resolve() for path in git_changed_files(args.since, input_folder))
+        tf_files = (tf_file for tf_file in tf_files if tf_file.resolve() in changed)
+    manifest = load_manifest(args.manifest) if args.manifest else None
+    if manifest is not None:
+        tf_files = (tf_file for tf_file in tf_files if is_changed(tf_file, manifest))
+    if streamed:
+        discovered = tf_files
+        tf_files = []
+        batches = stream_batches(discovered, min(args.batch_size, DISCOVERY_BATCH_SIZE), collected=tf_files)
+    else:
+        tf_files = list(tf_files)
+        if args.shard is not None:
+            tf_files = select_shard(tf_files, *args.shard, args.shard_manifest)
+            print(f"Shard {args.shard[0]}/{args.shard[1]}: {len(tf_files)} file(s)")
+        if not tf_files and not args.daemon and args.shard is None:
+            print("Nothing to format.")
+            return 0
+        if args.compare_backends:
+            return compare_fmt_backends(tf_files)
+        batches = split_batches(tf_files, args.batch_size, args.jobs)
+
+    stages = build_stages(args.fmt_backend)
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(args.cache_dir, formatter_fingerprint(stages), args.cache_size * 1024 * 1024)
+    if args.stream or args.mmap:
+        cache = None
+    input_roots = tuple(path for path in args.files or [input_folder] if path.is_dir()) if args.recursive else ()
+    profile = args.profile or args.trace_memory or args.profile_json is not None or args.trace is not None
+    options = RunOptions(output_folder, stages, args.emit_intermediates, cache, profile, args.trace_memory,
+                         args.stream_chunk_size, args.block_memo, check, args.diff, args.check_target,
+                         input_roots, not args.no_verify, args.index is not None and not (check or args.daemon))
+    if args.daemon:
+        return run_daemon(FormatDaemon(options, input_folder, partial(list_inputs, args, input_folder)), tf_files,
+                          args.socket, args.poll_interval)
+    if check:
+        worker = partial(check_files, options=options)
+    else:
+        format_files = format_streamed if args.stream else format_mapped_files if args.mmap else format_batch
+        worker = partial(format_files, options=options)
+
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            batch_reports = list(executor.map(worker, batches))
+    else:
+        batch_reports = map(worker, batches)
+
+    if check:
+        return report_check(batch_reports)
+
+    totals = {}
+    failures = []
+    cache_hits = 0
+    block_hits = 0
+    block_misses = 0
+    outputs = 0
+    modified = 0
+    reports = [report for reports in batch_reports for report in reports]
+    if args.shard is not None:
+        bundle_file = args.bundle or default_bundle_path(*args.shard)
+        write_bundle(bundle_file, *args.shard, reports, output_folder, tf_files)
+        shutil.rmtree(output_folder)
+        print(f"✔ Wrote the results of shard {args.shard[0]}/{args.shard[1]} to {bundle_file}")
+    if not reports:
+        print("Nothing to format.")
+        return 0
+    for report in reports:
+        print("\n".join(report.log))
+        cache_hits += report.cached
+        block_hits += report.block_hits
+        block_misses += report.block_misses
+        outputs += report.outputs
+        modified += report.modified
+        for stage_name, elapsed in report.timings.items():
+            totals[stage_name] = totals.get(stage_name, 0.0) + elapsed
+        if report.error:
+            failures.append(report)
 
-    for tf_file in input_folder.glob("*.tf"):
-        print(f"Formatting: {tf_file.name}")
-
-        original_unformatted_content = tf_file.read_text(encoding="utf-8")
-        
-        reorder_resource_properties_output_content = reorder_resource_properties(original_unformatted_content)
-        reorder_resource_properties_output_file = output_folder / f"reorder_resource_properties-{tf_file.name}"
-        reorder_resource_properties_output_file.write_text(reorder_resource_properties_output_content, encoding="utf-8")
-        print(f"✔ Reordered the resource properties -> {reorder_resource_properties_output_file}")
-        
-        reorder_resource_properties_file_content = reorder_resource_properties_output_file.read_text(encoding="utf-8")
-        
-        indented_heredoc_output_content = convert_to_indented_heredoc(reorder_resource_properties_file_content)
-        indented_heredoc_output_file = output_folder / f"indented-heredoc-{tf_file.name}"
-        indented_heredoc_output_file.write_text(indented_heredoc_output_content, encoding="utf-8")
-        print(f"✔ Converted to indented heredoc -> {indented_heredoc_output_file}")
-        
-        indented_heredoc_file_content = indented_heredoc_output_file.read_text(encoding="utf-8")
-        
-        aligned_heredoc_output_content = align_heredoc_closing_delimited(indented_heredoc_file_content)
-        aligned_heredoc_output_file = output_folder / f"aligned-heredoc-{tf_file.name}"
-        aligned_heredoc_output_file.write_text(aligned_heredoc_output_content, encoding="utf-8")
-        print(f"✔ Modified to align heredoc closing delimited -> {aligned_heredoc_output_file}")
-        
-        aligned_heredoc_file_content = aligned_heredoc_output_file.read_text(encoding="utf-8")
-        
-        tf_fmt_formatted_output_content = terraform_fmt(aligned_heredoc_file_content)
-        tf_fmt_output_file = output_folder / f"formatted-official-{tf_file.name}"
-        tf_fmt_output_file.write_text(tf_fmt_formatted_output_content, encoding="utf-8")
-        print(f"✔ Formatted file by `terraform fmt` -> {tf_fmt_output_file}")
-        
-        align_key_value_pairs_output_content = align_key_value_pairs(aligned_heredoc_file_content)
-        align_key_value_pairs_output_file = output_folder / f"formatted-custom-{tf_file.name}"
-        align_key_value_pairs_output_file.write_text(align_key_value_pairs_output_content, encoding="utf-8")
-        print(f"✔ Formatted file by aligning = in key-value pairs -> {align_key_value_pairs_output_file}")  
+    print_stage_timings(totals, len(tf_files) - len(failures) - cache_hits)
+    if profile:
+        file_metrics = dict((report.name, report.metrics) for report in reports if report.metrics)
+        print_profile(file_metrics)
+        if args.profile_json is not None:
+            write_profile_json(args.profile_json, file_metrics)
+        if args.trace is not None:
+            write_chrome_trace(args.trace, file_metrics)
+    if cache is not None:
+        evicted = cache.evict()
+        print(f"Cache: {cache_hits} hit(s), {len(tf_files) - cache_hits} miss(es), {evicted} evicted")
+    print(f"Outputs: {modified} of {outputs} file(s) modified")
+    if block_hits or block_misses:
+        print(f"Block memo: {block_hits} hit(s), {block_misses} miss(es)")
+    if args.index is not None:
+        index = ResourceIndex.load(args.index)
+        for tf_file, report in zip(tf_files, reports):
+            if report.resources is not None:
+                index.update(tf_file, report.resources)
+        index.save(args.index)
+    if manifest is not None:
+        save_manifest(args.manifest, manifest,
+                      [tf_file for tf_file, report in zip(tf_files, reports) if not report.error])
+    if failures:
+        print(f"✘ {len(failures)} of {len(tf_files)} file(s) failed to format:")
+        for report in failures:
+            print(f"  {report.name}: {report.error}")
+        return 1
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
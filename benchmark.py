@@ -0,0 +1,253 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .__main__ import main
+from .custom_fmt import reorder_resource_properties, align_key_value_pairs
+from .heredoc_fmt import convert_to_indented_heredoc, align_heredoc_closing_delimited
+from .kql_fmt import format_kql, format_kql_queries
+from .pipeline import STAGES
+from .terraform_fmt import terraform_fmt_batch
+
+KQL_TABLES = ["SecurityEvent", "SigninLogs", "AzureActivity", "AuditLogs", "OfficeActivity"]
+TACTICS = ["InitialAccess", "Persistence", "PrivilegeEscalation", "DefenseEvasion", "CredentialAccess"]
+
+def messy(key: str, value: str, rng: random.Random, indent: str) -> str:
+    """
+    A key-value line with the kind of inconsistent spacing found in hand-edited files.
+    """
+    before = rng.choice(["", " ", "   "])
+    after = rng.choice(["", " ", "  "])
+    return f"{indent}{rng.choice(['', ' '])}{key}{before}={after}{value}"
+
+
+def generate_resource(index: int, rng: random.Random, heredoc_lines: int, depth: int) -> str:
+    indent = rng.choice(["", "  ", "    "])
+    lines = [f'resource "azurerm_sentinel_alert_rule_scheduled" "rule_{index}" {{']
+    properties = [
+        messy("name", f'"rule-{index}"', rng, indent),
+        messy("log_analytics_workspace_id", "azurerm_log_analytics_workspace.main.id", rng, indent),
+        messy("severity", f'"{rng.choice(["High", "Medium", "Low"])}"', rng, indent),
+        messy("tactics", f'["{rng.choice(TACTICS)}"]', rng, indent),
+        messy("display_name", f'"Rule {index}"', rng, indent),
+        messy("description", f'"Detects pattern {index} {{ with braces }}"', rng, indent),
+        messy("suppression_duration", '"PT5H"', rng, indent),
+    ]
+    rng.shuffle(properties)
+    lines.extend(properties)
+
+    lines.append(f"{indent}query = <<QUERY")
+    query = [rng.choice(KQL_TABLES)]
+    query.extend(f'where Field{line_index}=="value {{{line_index}}}" and Count> {line_index}'
+                 for line_index in range(max(heredoc_lines - 1, 0)))
+    if rng.random() < 0.5:
+        # Pipes leading the operator lines
+        lines.append(query[0])
+        lines.extend(f"| {operator}" for operator in query[1:])
+    else:
+        # Pipes trailing the previous line
+        lines.extend(f"{operator} |" for operator in query[:-1])
+        lines.append(query[-1])
+    lines.append("QUERY")
+
+    for level in range(depth):
+        lines.append(f"{indent * (level + 1) or ' '}nested_{level} {{")
+        lines.append(messy("enabled", "true", rng, indent * (level + 2)))
+        lines.append(messy("lookback_duration", '"PT5H"', rng, indent * (level + 2)))
+    for level in reversed(range(depth)):
+        lines.append(f"{indent * (level + 1)}}}")
+
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def generate_corpus(directory: Path, files: int, resources: int, heredoc_lines: int, depth: int,
+                    seed: int = 0) -> list:
+    """
+    Writes `files` synthetic Sentinel rule files into `directory` and returns their paths.
+    """
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for file_index in range(files):
+        resources_text = [generate_resource(file_index * resources + index, rng, heredoc_lines, depth)
+                          for index in range(resources)]
+        path = directory / f"rules_{file_index:05d}.tf"
+        path.write_text("\n\n".join(resources_text) + "\n", encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def time_calls(func, inputs: list, repeat: int, input_bytes: int = None, before_pass=None) -> dict:
+    """
+    Runs `func` over every input `repeat` times; reports the best and median wall time of one full pass.
+    `before_pass` is called (untimed) before every pass, e.g. to empty a cache filled by the previous one.
+    """
+    passes = []
+    for _ in range(repeat):
+        if before_pass is not None:
+            before_pass()
+        start = time.perf_counter()
+        for content in inputs:
+            func(content)
+        passes.append(time.perf_counter() - start)
+    if input_bytes is None:
+        input_bytes = sum(len(content.encode("utf-8")) for content in inputs)
+    best = min(passes)
+    return {
+        "best_seconds": best,
+        "median_seconds": statistics.median(passes),
+        "bytes": input_bytes,
+        "mb_per_second": input_bytes / best / 1e6 if best else None,
+    }
+
+
+def benchmark_stages(contents: list, repeat: int) -> dict:
+    """
+    Times every stage on its own, each fed with the output of the stage before it (as in the pipeline).
+    """
+    results = {}
+    total_bytes = sum(len(content.encode("utf-8")) for content in contents)
+    reordered = [reorder_resource_properties(content) for content in contents]
+    indented = [convert_to_indented_heredoc(content) for content in reordered]
+    kql_formatted = [format_kql_queries(content) for content in indented]
+    aligned = [align_heredoc_closing_delimited(content) for content in kql_formatted]
+
+    results["reorder_resource_properties"] = time_calls(reorder_resource_properties, contents, repeat)
+    results["convert_to_indented_heredoc"] = time_calls(convert_to_indented_heredoc, reordered, repeat)
+    results["format_kql_queries"] = time_calls(format_kql_queries, indented, repeat, before_pass=format_kql.cache_clear)
+    results["align_heredoc_closing_delimited"] = time_calls(align_heredoc_closing_delimited, kql_formatted, repeat)
+    results["align_key_value_pairs"] = time_calls(align_key_value_pairs, aligned, repeat)
+    results["terraform_fmt[native]"] = time_calls(
+        lambda batch: terraform_fmt_batch(batch, backend="native"), [aligned], repeat, total_bytes)
+    if shutil.which("terraform"):
+        results["terraform_fmt[terraform]"] = time_calls(
+            lambda batch: terraform_fmt_batch(batch, backend="terraform"), [aligned], repeat, total_bytes)
+    return results
+
+
+@contextlib.contextmanager
+def corpus_workdir(corpus_dir: Path):
+    """
+    Runs the body in a scratch directory holding a copy of the corpus as `unformatted/`.
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        shutil.copytree(corpus_dir, Path(workdir) / "unformatted")
+        previous_cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            yield
+        finally:
+            os.chdir(previous_cwd)
+
+
+def benchmark_main(corpus_dir: Path, repeat: int, main_args: list) -> dict:
+    """
+    Times the whole `main()` pipeline (reading, formatting and writing) over the corpus, without the cache.
+    """
+    passes = []
+    with corpus_workdir(corpus_dir):
+        for _ in range(repeat):
+            shutil.rmtree("formatted", ignore_errors=True)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                main(["--no-cache"] + main_args)
+            passes.append(time.perf_counter() - start)
+    return {"best_seconds": min(passes), "median_seconds": statistics.median(passes), "args": main_args}
+
+
+def run_idempotence(corpus_dir: Path, main_args: list) -> int:
+    """
+    Formats the corpus, then runs `--check` on the outputs of every terminal stage (against that stage):
+    freshly formatted files must check clean. Returns 1 if any of them would be reformatted.
+    """
+    failures = 0
+    with corpus_workdir(corpus_dir):
+        with contextlib.redirect_stdout(io.StringIO()):
+            main(["--no-cache"] + main_args)
+        for stage in STAGES:
+            if not stage.terminal:
+                continue
+            shutil.rmtree("unformatted")
+            shutil.copytree("formatted", "unformatted")
+            log = io.StringIO()
+            with contextlib.redirect_stdout(log):
+                code = main(["--no-cache", "--check", "--check-target", stage.name] + main_args +
+                            [str(path) for path in sorted(Path("unformatted").glob(f"{stage.artifact_prefix}-*.tf"))])
+            failures += code != 0
+            print(f"{'✔' if code == 0 else '✘'} --check on the {stage.name} outputs exited with {code}")
+            if code != 0:
+                print("\n".join(line for line in log.getvalue().splitlines() if line.startswith("✘")))
+    return 1 if failures else 0
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=Path(__file__).parent,
+                              check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every formatting stage on a synthetic Sentinel corpus.")
+    parser.add_argument("--files", type=int, default=50, help="number of generated .tf files")
+    parser.add_argument("--resources", type=int, default=20, help="resources per file")
+    parser.add_argument("--heredoc-lines", type=int, default=10, help="lines in every `query` heredoc")
+    parser.add_argument("--depth", type=int, default=2, help="nesting depth of blocks inside every resource")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the corpus generator")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes per measurement (best is reported)")
+    parser.add_argument("--jobs", type=int, default=1, help="--jobs passed to main() for the full-pipeline run")
+    parser.add_argument("--output", type=Path, default=Path("bench_output.json"),
+                        help="machine-readable results file")
+    parser.add_argument("--idempotence", action="store_true",
+                        help="instead of the benchmark, format the corpus and fail unless `--check` passes on the "
+                             "outputs, i.e. one pass of the formatter reaches a fixpoint")
+    return parser.parse_args(argv)
+
+
+def run(argv=None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as corpus_root:
+        corpus_dir = Path(corpus_root) / "corpus"
+        paths = generate_corpus(corpus_dir, args.files, args.resources, args.heredoc_lines, args.depth, args.seed)
+        if args.idempotence:
+            return run_idempotence(corpus_dir, ["--jobs", str(args.jobs)])
+        contents = [path.read_text(encoding="utf-8") for path in paths]
+
+        report = {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "corpus": {
+                "files": args.files,
+                "resources_per_file": args.resources,
+                "heredoc_lines": args.heredoc_lines,
+                "depth": args.depth,
+                "seed": args.seed,
+                "bytes": sum(len(content.encode("utf-8")) for content in contents),
+            },
+            "repeat": args.repeat,
+            "stages": benchmark_stages(contents, args.repeat),
+            "main": benchmark_main(corpus_dir, args.repeat, ["--jobs", str(args.jobs)]),
+        }
+
+    args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    for name, result in report["stages"].items():
+        print(f"{name:<35} {result['best_seconds'] * 1000:10.2f} ms")
+    print(f"{'main()':<35} {report['main']['best_seconds'] * 1000:10.2f} ms")
+    print(f"Results written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run())
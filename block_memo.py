@@ -0,0 +1,208 @@
+import hashlib
+from dataclasses import dataclass, field
+
+from .hcl_parser import CLOSING, OPENING, split_lines, tokenize
+from .instrumentation import aggregate
+from .pipeline import STAGES, PipelineResult, run_pipeline_batch
+
+# String attributes whose values differ between otherwise identical templated rules. Their values
+# (and the resource name label) are masked before hashing, so such blocks share one memo entry.
+MASKED_ATTRIBUTES = {"name", "display_name"}
+
+PLACEHOLDER_MARKER = "__block_memo_"
+
+
+def placeholder(index: int) -> str:
+    return f'"{PLACEHOLDER_MARKER}{index}__"'
+
+
+def is_plain_string(text: str) -> bool:
+    return len(text) >= 2 and text[0] == text[-1] == '"' and not any(char in text[1:-1] for char in '"\\$%\n')
+
+
+def split_blocks(text: str) -> list:
+    """
+    Cuts `text` into independently formattable chunks like streaming.split_chunks does (a chunk ends after
+    a line closing a top-level block; every blank top-level line is a chunk of its own), but from a single
+    tokenization of the whole text. Returns (chunk, tokens of the chunk, chunk offset) triples; joining
+    the chunks with "\n" gives back `text`.
+    """
+    tokens = tokenize(text)
+    ends = []
+    depth = 0
+    line_depth = 0
+    line_start = 0
+    chunk_start = 0
+    blank = True
+    for token in tokens:
+        if token.kind == "newline":
+            if depth == 0 and (blank or line_depth > 0):
+                if blank and line_start > chunk_start:
+                    ends.append(line_start - 1)
+                ends.append(token.start)
+                chunk_start = token.end
+            line_depth = depth
+            line_start = token.end
+            blank = True
+            continue
+        blank = False
+        if token.kind in OPENING:
+            depth += 1
+        elif token.kind in CLOSING:
+            depth = max(depth - 1, 0)
+    ends.append(len(text))
+
+    blocks = []
+    start = 0
+    index = 0
+    for end in ends:
+        first = index
+        while index < len(tokens) and tokens[index].start < end:
+            index += 1
+        blocks.append((text[start:end], tokens[first:index], start))
+        start = end + 1
+        if index < len(tokens) and tokens[index].start == end:  # the newline between two chunks
+            index += 1
+    return blocks
+
+
+def mask_block(chunk: str, tokens: list, offset: int) -> tuple:
+    """
+    Replaces the name label of a resource block and the values of its MASKED_ATTRIBUTES with placeholders.
+    `tokens` are the chunk's tokens, positioned `offset` characters into the file.
+    Returns (template, masked values). Only plain strings on lines without comments are masked, so the
+    placeholders cannot change how the surrounding code is laid out.
+    """
+    if PLACEHOLDER_MARKER in chunk:
+        return chunk, []
+    commented_lines = set(token.line for token in tokens if token.kind == "comment")
+    code = [token for token in tokens if token.kind not in ("newline", "comment")]
+    if len(code) < 4 or code[0].text != "resource" or code[3].kind != "lbrace" or code[2].kind != "string":
+        return chunk, []
+
+    masked = []
+    if is_plain_string(code[2].text) and code[2].line not in commented_lines:
+        masked.append(code[2])
+    depth = 0
+    for index, token in enumerate(code[3:], 3):
+        if token.kind == "lbrace":
+            depth += 1
+        elif token.kind == "rbrace":
+            depth -= 1
+        elif depth == 1 and token.kind == "ident" and token.text in MASKED_ATTRIBUTES and index + 2 < len(code) \
+                and code[index + 1].text == "=" and is_plain_string(code[index + 2].text) \
+                and code[index + 2].line not in commented_lines \
+                and (index + 3 == len(code) or code[index + 3].line != token.line):
+            masked.append(code[index + 2])
+
+    parts = []
+    pos = 0
+    for index, token in enumerate(masked):
+        parts.append(chunk[pos:token.start - offset])
+        parts.append(placeholder(index))
+        pos = token.end - offset
+    parts.append(chunk[pos:])
+    return "".join(parts), [token.text for token in masked]
+
+
+def unmask(output: str, values: list):
+    """
+    Puts the masked values back into a formatted template; None if a placeholder did not survive exactly once.
+    """
+    for index, value in enumerate(values):
+        if output.count(placeholder(index)) != 1:
+            return None
+        output = output.replace(placeholder(index), value)
+    return output
+
+
+@dataclass
+class BlockMemo:
+    """
+    Formatted output of every distinct top-level block seen so far, keyed by the hash of its masked text.
+    """
+    entries: dict = field(default_factory=dict)
+
+    @staticmethod
+    def key(template: str) -> str:
+        return hashlib.sha256(template.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class MemoStats:
+    hits: int = 0
+    misses: int = 0
+
+
+def join_outputs(parts: list, final_newline: bool) -> str:
+    """
+    Joins the outputs of the consecutive chunks of one file. A chunk output may end with a line break of its
+    own (`terraform fmt` ends every file with one), which is dropped between chunks; the file ends with one
+    if the original did or the last chunk output does, as if the file had been formatted as a whole.
+    """
+    ends = bool(parts) and parts[-1].endswith("\n")
+    text = "\n".join(part[:-1] if part.endswith("\n") else part for part in parts)
+    return text + "\n" if text and (final_newline or ends) else text
+
+
+def run_pipeline_memoized(contents: list, memo: BlockMemo, stages: list = STAGES, keep_intermediates: bool = False,
+                          profile: bool = False, trace_memory: bool = False) -> tuple:
+    """
+    Like run_pipeline_batch, but formats every file block by block (see split_blocks) and formats
+    each distinct block only once: repeated blocks reuse the memoized outputs of every stage, including
+    `terraform fmt`. All blocks missing from `memo` are formatted together in one batch.
+    Returns (one PipelineResult per input, one MemoStats per input); only non-blank blocks are counted.
+    """
+    files = []
+    pending = {}
+    stats = [MemoStats() for _ in contents]
+    for file_stats, content in zip(stats, contents):
+        blocks = []
+        for chunk, tokens, offset in split_blocks("\n".join(split_lines(content))):
+            template, values = mask_block(chunk, tokens, offset)
+            key = BlockMemo.key(template)
+            if key not in memo.entries and key not in pending:
+                pending[key] = template
+                owner = True
+            else:
+                owner = False
+            if chunk.strip():
+                file_stats.hits += not owner
+                file_stats.misses += owner
+            blocks.append((chunk, key, values, owner))
+        files.append(blocks)
+
+    keys = list(pending)
+    for key, result in zip(keys, run_pipeline_batch([pending[key] for key in keys], stages, keep_intermediates,
+                                                     profile, trace_memory)):
+        memo.entries[key] = result
+
+    # Blocks whose placeholders were mangled by a stage are formatted again unmasked
+    fallback = {}
+    for blocks in files:
+        for chunk, key, values, _ in blocks:
+            if values and any(unmask(output, values) is None for output in memo.entries[key].outputs.values()):
+                fallback[chunk] = None
+    for chunk, result in zip(list(fallback), run_pipeline_batch(list(fallback), stages, keep_intermediates,
+                                                                profile, trace_memory)):
+        fallback[chunk] = result
+
+    results = []
+    for content, blocks in zip(contents, files):
+        result = PipelineResult(timings=dict((stage.name, 0.0) for stage in stages))
+        outputs = dict((stage_name, []) for stage_name in memo.entries[blocks[0][1]].outputs) if blocks else {}
+        block_metrics = {}
+        for index, (chunk, key, values, owner) in enumerate(blocks):
+            block_result = fallback[chunk] if chunk in fallback else memo.entries[key]
+            for stage_name, output in block_result.outputs.items():
+                outputs[stage_name].append(output if chunk in fallback else unmask(output, values))
+            if owner or chunk in fallback:
+                for stage_name, elapsed in block_result.timings.items():
+                    result.timings[stage_name] += elapsed
+                block_metrics[index] = block_result.metrics
+        result.outputs = dict((stage_name, join_outputs(parts, content.endswith("\n")))
+                              for stage_name, parts in outputs.items())
+        if profile:
+            result.metrics = aggregate(block_metrics)
+        results.append(result)
+    return results, stats
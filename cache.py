@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from .ordering import PROPERTY_ORDERS
+
+DEFAULT_CACHE_DIR = ".tf-format-cache"
+DEFAULT_CACHE_SIZE_MB = 256
+
+
+@lru_cache(maxsize=None)
+def terraform_version() -> str:
+    """
+    Version reported by the `terraform` binary, or "unavailable" when it cannot be run.
+    """
+    try:
+        completed = subprocess.run(["terraform", "version", "-json"], check=True, capture_output=True)
+        return json.loads(completed.stdout).get("terraform_version", "unknown")
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return "unavailable"
+
+
+def formatter_fingerprint(stages: list) -> str:
+    """
+    Hash of everything besides the input that decides the output: the property order, the stage list
+    (including stage options such as the fmt backend), the formatter source code and, when the `terraform`
+    binary is used, its version.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(PROPERTY_ORDERS, sort_keys=True).encode())
+    uses_terraform = False
+    for stage in stages:
+        options = sorted(getattr(stage.func, "keywords", {}).items())
+        digest.update(f"{stage.name}:{stage.source}:{stage.terminal}:{options}".encode())
+        uses_terraform = uses_terraform or ("backend", "terraform") in options
+    for source_file in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(source_file.read_bytes())
+    if uses_terraform:
+        digest.update(terraform_version().encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent cache of final pipeline outputs, one JSON file per entry, keyed by a hash of the input
+    content plus the formatter fingerprint. Entry mtimes double as access times for LRU eviction.
+    Safe to share between worker processes: entries are written via a temp file and an atomic rename.
+    """
+
+    def __init__(self, directory: Path, fingerprint: str, max_bytes: int = DEFAULT_CACHE_SIZE_MB * 1024 * 1024):
+        self.directory = Path(directory)
+        self.fingerprint = fingerprint
+        self.max_bytes = max_bytes
+
+    def key(self, content: str) -> str:
+        return hashlib.sha256(self.fingerprint.encode() + b"\0" + content.encode("utf-8")).hexdigest()
+
+    def entry_path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, content: str) -> Optional[dict]:
+        """
+        Returns the cached outputs (stage name -> text) for `content`, or None on a miss.
+        """
+        path = self.entry_path(self.key(content))
+        try:
+            outputs = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return outputs
+
+    def put(self, content: str, outputs: dict):
+        path = self.entry_path(self.key(content))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp:
+            json.dump(outputs, tmp)
+        os.replace(tmp_name, path)
+
+    def evict(self) -> int:
+        """
+        Removes least recently used entries until the cache fits in `max_bytes`. Returns the number removed.
+        """
+        entries = []
+        total = 0
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
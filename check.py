@@ -0,0 +1,116 @@
+import difflib
+
+from .document import Document, as_text
+from .hcl_parser import parse, split_lines
+from .pipeline import STAGES, run_stage
+
+DEFAULT_CHECK_TARGET = "terraform_fmt"
+
+
+def stage_path(stages: list, target: str) -> list:
+    """
+    The chain of stages producing `target`, in execution order (stages on other branches are left out).
+    """
+    by_name = dict((stage.name, stage) for stage in stages)
+    if target not in by_name:
+        raise ValueError(f"unknown stage: {target}")
+    path = []
+    name = target
+    while name is not None:
+        path.append(by_name[name])
+        name = by_name[name].source
+    return path[::-1]
+
+
+def text_lines(value) -> list:
+    return list(value.lines) if isinstance(value, Document) else split_lines(value)
+
+
+def check_batch(contents: list, stages: list = STAGES, target: str = DEFAULT_CHECK_TARGET,
+                keep_output: bool = False) -> list:
+    """
+    Runs the stages leading to `target` over a group of files, without writing anything. A file drops out at
+    the first stage that changes it, unless `keep_output` is set (the formatted text is needed for a diff).
+    Returns (name of the first stage that changed the file or None, formatted text or None) per file.
+    Files differing only in a trailing newline or line endings count as unchanged, like in the pipeline.
+    """
+    values = list(contents)
+    first_change = [None] * len(contents)
+    pending = list(range(len(contents)))
+    for stage in stage_path(stages, target):
+        if not pending:
+            break
+        inputs = [text_lines(values[index]) for index in pending]
+        if stage.batch is not None:
+            outputs = stage.batch([as_text(values[index]) for index in pending])
+        else:
+            outputs = [run_stage(stage, values[index], shared=False) for index in pending]
+
+        still_pending = []
+        for index, stage_input, stage_output in zip(pending, inputs, outputs):
+            values[index] = stage_output
+            if text_lines(stage_output) == stage_input:
+                still_pending.append(index)
+                continue
+            if first_change[index] is None:
+                first_change[index] = stage.name
+            if keep_output:
+                still_pending.append(index)
+        pending = still_pending
+
+    return [(stage_name, as_text(value) if keep_output and stage_name is not None else None)
+            for stage_name, value in zip(first_change, values)]
+
+
+def segments(text: str, lines: list) -> list:
+    """
+    Splits a file into (label, first line, last line + 1) segments, one per top-level block or attribute,
+    each running up to the next one so that comments and blank lines in between belong to a segment.
+    """
+    items = parse(text)
+    starts = [0] + [item.start_line for item in items[1:]] if items else [0]
+    ends = starts[1:] + [len(lines)]
+    labels = [getattr(item, "address", None) or item.name for item in items] or [""]
+    return list(zip(labels, starts, ends))
+
+
+def format_hunks(label: str, before: list, after: list, before_start: int, after_start: int,
+                 context: int = 3) -> list:
+    hunks = []
+    matcher = difflib.SequenceMatcher(None, before, after, autojunk=False)
+    for group in matcher.get_grouped_opcodes(context):
+        first, last = group[0], group[-1]
+        before_from, before_to = first[1], last[2]
+        after_from, after_to = first[3], last[4]
+        hunks.append(f"@@ -{before_start + before_from + 1},{before_to - before_from} "
+                     f"+{after_start + after_from + 1},{after_to - after_from} @@ {label}".rstrip())
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                hunks.extend(f" {line}" for line in before[i1:i2])
+                continue
+            hunks.extend(f"-{line}" for line in before[i1:i2])
+            hunks.extend(f"+{line}" for line in after[j1:j2])
+    return hunks
+
+
+def block_diff(name: str, original: str, formatted: str) -> str:
+    """
+    Unified diff of `original` against `formatted`, computed only over the top-level blocks whose text
+    changed (formatting never adds, removes or reorders top-level blocks). Hunks are labelled with the
+    block address. Falls back to diffing the whole file if the blocks cannot be paired up.
+    """
+    before_lines = split_lines(original)
+    after_lines = split_lines(formatted)
+    before_segments = segments(original, before_lines)
+    after_segments = segments(formatted, after_lines)
+    if [label for label, _, _ in before_segments] != [label for label, _, _ in after_segments]:
+        before_segments = [("", 0, len(before_lines))]
+        after_segments = [("", 0, len(after_lines))]
+
+    lines = [f"--- {name}", f"+++ {name} (formatted)"]
+    for (label, before_from, before_to), (_, after_from, after_to) in zip(before_segments, after_segments):
+        before = before_lines[before_from:before_to]
+        after = after_lines[after_from:after_to]
+        if before != after:
+            lines.extend(format_hunks(label, before, after, before_from, after_from))
+    return "\n".join(lines) if len(lines) > 2 else ""
@@ -1,121 +1,134 @@
 import re
+from .document import Document, shift_node
+from .hcl_parser import Attribute, Block
+from .ordering import rank_table, sort_key
 
 def reorder_resource_properties(content: str) -> str:
     """
     Reorders properties in Terraform resource blocks.
     """
-    preferred_order = ["suppression_duration", "query", "display_name", "description", "name", "severity", "tactics"]
-
-    lines = content.splitlines()
-    output = []
-    inside_resource = False
-    resource_lines = []
-    brace_count = 0
-
-    for line in lines:
-        stripped = line.strip()
-
-        # Detect start of resource block
-        if re.match(r'resource\s+".*"\s+".*"\s*{', stripped):
-            inside_resource = True
-            resource_lines = [line]
-            brace_count = line.count("{") - line.count("}")
-            continue
-
-        if inside_resource:
-            resource_lines.append(line)
-            brace_count += line.count("{") - line.count("}")
-            
-            # End of resource block
-            if brace_count == 0:
-                # Reorder properties inside the block
-                reordered_lines = []
-                other_lines = []
-
-                # Collect property blocks
-                i = 1  # skip first line (resource declaration)
-                while i < len(resource_lines) - 1:  # skip last line (closing brace)
-                    l = resource_lines[i]
-                    prop_match = re.match(r'\s*(\w+)\s*=', l)
-                    if prop_match:
-                        prop_name = prop_match.group(1)
-                        # Capture multi-line heredoc or block
-                        block_lines = [l]
-                        i += 1
-                        if "<<-" in l or "<<" in l:  # heredoc
-                            delimiter = re.search(r'<<-?([A-Z0-9_]+)', l).group(1)
-                            while i < len(resource_lines) - 1:
-                                block_lines.append(resource_lines[i])
-                                if resource_lines[i].strip() == delimiter:
-                                    i += 1
-                                    break
-                                i += 1
-                        # Save in order dict
-                        if prop_name in preferred_order:
-                            reordered_lines.append((preferred_order.index(prop_name), block_lines))
-                        else:
-                            other_lines.append(block_lines)
-                    else:
-                        other_lines.append([l])
-                        i += 1
-
-                # Sort by preferred order and flatten
-                reordered_lines.sort(key=lambda x: x[0])
-                flat_lines = []
-                for _, lines_block in reordered_lines:
-                    flat_lines.extend(lines_block)
-                for lines_block in other_lines:
-                    flat_lines.extend(lines_block)
-
-                # Append resource declaration and closing brace
-                output.append(resource_lines[0])
-                output.extend(flat_lines)
-                output.append(resource_lines[-1])
-
-                inside_resource = False
-            continue
-
-        # Outside resource, just append
-        output.append(line)
-
-    return "\n".join(output)
+    document = Document(content)
+    reorder_resource_properties_document(document)
+    return document.text()
+
+def reorder_resource_properties_document(document: Document):
+    """
+    Reorders properties in the resource blocks of `document`, in place, by the order configured for their
+    resource type (see ordering.PROPERTY_ORDERS); nested blocks by the order configured for their path.
+    """
+    for block in document.blocks("resource"):
+        if block.labels:
+            reorder_block(document.lines, block, block.labels[0], ())
+
+def reorder_block(lines: list, block: Block, resource_type: str, block_path: tuple):
+    # Depth first with a stack rather than recursion, so deeply nested blocks cannot exceed the recursion limit
+    pending = [(block, block_path)]
+    while pending:
+        block, block_path = pending.pop()
+        table = rank_table(resource_type, block_path)
+        if table is not None:
+            reorder_body(lines, block, table)
+        pending.extend((child, block_path + (child.type,)) for child in reversed(block.blocks()))
+
+def reorder_body(lines: list, block: Block, table: dict):
+    # Split the body into segments: every attribute / nested block keeps all of its lines (multi-line values,
+    # heredocs) and the comments and blank lines above it; lines after the last item are one more segment.
+    # A segment is (item, lines, number of lines before the item)
+    segments = []
+    pending = []
+    line_number = block.start_line + 1
+    children = iter(block.body)
+    child = next(children, None)
+    while line_number < block.end_line:
+        if child is not None and child.start_line == line_number:
+            segments.append((child, pending + lines[child.start_line:child.end_line + 1], len(pending)))
+            pending = []
+            line_number = child.end_line + 1
+            child = next(children, None)
+        else:
+            pending.append(lines[line_number])
+            line_number += 1
+    if pending:
+        segments.append((None, pending, len(pending)))
+
+    # Items sharing a line with the block braces (or with each other) cannot be moved line by line
+    if child is not None or line_number != block.end_line:
+        return
+
+    # One stable sort by rank; everything unranked keeps its relative order after the ranked attributes
+    first = segments[0] if segments else None
+    segments.sort(key=lambda segment: sort_key(table, segment[0].name if isinstance(segment[0], Attribute) else None))
+
+    # Blank lines right below the opening brace stay there rather than moving with the item they preceded
+    if segments and segments[0] is not first:
+        swap_leading_blank_lines(segments, segments.index(first))
+
+    # Write the segments back and move each tree node to its new position
+    line_number = block.start_line + 1
+    for item, lines_block, leading in segments:
+        if item is not None:
+            shift_node(item, line_number + leading - item.start_line)
+        lines[line_number:line_number + len(lines_block)] = lines_block
+        line_number += len(lines_block)
+    block.body.sort(key=lambda node: node.start_line)
+
+def swap_leading_blank_lines(segments: list, index: int):
+    """
+    Exchanges the blank lines at the top of segments[0] and segments[index].
+    """
+    def split(segment):
+        item, lines_block, leading = segment
+        count = 0
+        while count < leading and not lines_block[count].strip():
+            count += 1
+        return lines_block[:count], (item, lines_block[count:], leading - count)
+
+    blank_first, (item, rest, leading) = split(segments[0])
+    blank_other, (other, other_rest, other_leading) = split(segments[index])
+    segments[0] = (item, blank_other + rest, leading + len(blank_other))
+    segments[index] = (other, blank_first + other_rest, other_leading + len(blank_first))
 
 def align_key_value_pairs(content: str) -> str:
     """
     Aligns the '=' signs for all simple key-value pairs in the content.
     """
-    lines = content.splitlines()
-    formatted_lines = []
+    document = Document(content)
+    align_key_value_pairs_document(document)
+    return document.text()
+
+def align_key_value_pairs_document(document: Document):
+    """
+    Aligns the '=' signs for all simple key-value pairs in `document`, in place.
+    Heredoc bodies are literal content (e.g. KQL) and are never touched.
+    """
+    lines = document.lines
+    heredoc_body_lines = document.heredoc_body_lines()
     block = []
     max_key_length = 0
 
     # Match only the first "=" (not "=="), splitting key from value
     kv_pattern = re.compile(r'^(\s*)(\w+)\s*=\s+(.*)$')
 
-    for line in lines:
-        kv_match = kv_pattern.match(line)
+    def flush():
+        for line_number, indent, key, value in block:
+            spaces = ' ' * (max_key_length - len(key))
+            lines[line_number] = f"{indent}{key}{spaces} = {value}"
+
+    for line_number, line in enumerate(lines):
+        kv_match = kv_pattern.match(line) if line_number not in heredoc_body_lines else None
         if kv_match:
             indent, key, value = kv_match.groups()
             # Exclude lines that *start* with something like "if (...) ==" (heredoc code)
             if not key.startswith("if") and not key.endswith("=="):
-                block.append((indent, key, value))
+                block.append((line_number, indent, key, value))
                 max_key_length = max(max_key_length, len(key))
                 continue
 
         # Flush current block if exists
         if block:
-            for indent, key, value in block:
-                spaces = ' ' * (max_key_length - len(key))
-                formatted_lines.append(f"{indent}{key}{spaces} = {value}")
+            flush()
             block = []
             max_key_length = 0
 
-        formatted_lines.append(line)
-
     # Flush any remaining block
-    if block:
-        for indent, key, value in block:
-            spaces = ' ' * (max_key_length - len(key))
-            formatted_lines.append(f"{indent}{key}{spaces} = {value}")
-
-    return "\n".join(formatted_lines)
\ No newline at end of file
+    flush()
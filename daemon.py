@@ -0,0 +1,333 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from dataclasses import asdict, replace
+from pathlib import Path
+from typing import Callable, Optional
+
+from .block_memo import BlockMemo, run_pipeline_memoized
+from .check import DEFAULT_CHECK_TARGET
+from .incremental import file_signature
+from .pipeline import run_pipeline_batch
+from .range_fmt import apply_edits, format_selection
+from .runner import RunOptions, check_files, describe_error, format_batch
+from .verify import verify_text
+
+DEFAULT_SOCKET = ".tf-format.sock"
+DEFAULT_POLL_INTERVAL = 0.5
+
+# Editors often write a file in several steps; events arriving this soon after the first one are batched with it
+DEBOUNCE_SECONDS = 0.05
+
+# The block memo is dropped and rebuilt once it holds this many distinct blocks
+DAEMON_MEMO_ENTRIES = 50000
+
+# Request keys selecting the part of the content to format (see FormatDaemon.handle)
+RANGE_KEYS = ("lines", "bytes", "address")
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """
+    Reports the `.tf` files written to or moved into the watched folders, and the folders created in them,
+    through the Linux inotify API of libc. Raises OSError where inotify is not available.
+    """
+    kind = "inotify"
+
+    def __init__(self, folders: set):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.folders = {}  # watch descriptor -> folder
+        try:
+            self.watch(folders)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def watch(self, folders: set):
+        """
+        Adds a watch for each of `folders` not watched yet. Folders that disappeared in the meantime are
+        skipped, unless none could be watched at all.
+        """
+        watched = set(self.folders.values())
+        for folder in sorted(set(folders) - watched):
+            descriptor = self.libc.inotify_add_watch(self.fd, os.fsencode(folder),
+                                                     IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+            if descriptor >= 0:
+                self.folders[descriptor] = Path(folder)
+            elif not self.folders:
+                raise OSError(ctypes.get_errno(), f"cannot watch {folder}")
+
+    def read_events(self) -> set:
+        changed = set()
+        data = os.read(self.fd, 64 * 1024)
+        pos = 0
+        while pos < len(data):
+            descriptor, mask, _, length = INOTIFY_EVENT.unpack_from(data, pos)
+            pos += INOTIFY_EVENT.size
+            name = data[pos:pos + length].rstrip(b"\0").decode("utf-8", errors="surrogateescape")
+            pos += length
+            folder = self.folders.get(descriptor)
+            if folder is not None and (name.endswith(".tf") or mask & IN_ISDIR):
+                changed.add(folder / name)
+        return changed
+
+    def changes(self, timeout: float) -> set:
+        """
+        Waits up to `timeout` seconds for changes; returns the changed files (empty on timeout).
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = self.read_events()
+        while select.select([self.fd], [], [], DEBOUNCE_SECONDS)[0]:
+            changed |= self.read_events()
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Fallback for InotifyWatcher: compares the mtime/size of the files listed by `list_files` every `timeout`
+    seconds.
+    """
+    kind = "polling"
+
+    def __init__(self, list_files: Callable[[], list]):
+        self.list_files = list_files
+        self.signatures = self.scan()
+
+    def scan(self) -> dict:
+        signatures = {}
+        for tf_file in self.list_files():
+            try:
+                signatures[tf_file] = file_signature(tf_file)
+            except OSError:
+                continue
+        return signatures
+
+    def watch(self, folders: set):
+        pass
+
+    def changes(self, timeout: float) -> set:
+        time.sleep(timeout)
+        signatures = self.scan()
+        changed = set(path for path, signature in signatures.items() if self.signatures.get(path) != signature)
+        self.signatures = signatures
+        return changed
+
+    def close(self):
+        pass
+
+
+def watched_folders(roots: tuple, tf_files: list) -> set:
+    """
+    The folders to watch for `tf_files`: the input roots and every folder holding one of the files.
+    """
+    return set(Path(root) for root in roots) | set(tf_file.parent for tf_file in tf_files)
+
+
+def open_watcher(folders: set, list_files: Callable[[], list]):
+    try:
+        return InotifyWatcher(folders)
+    except (OSError, AttributeError):
+        return PollingWatcher(list_files)
+
+
+class FormatDaemon:
+    """
+    Formatting state kept warm between runs: the stages, the result cache, the KQL cache and, with
+    `--block-memo`, a block memo shared by every request, so that a file whose blocks were seen before is
+    rendered almost for free.
+    Requests from the watcher and from clients are served one at a time. `list_files` lists the input files
+    the way the command line selected them (by default the `.tf` files of `input_folder`); it decides which
+    files are watched and what an empty file list stands for.
+    """
+
+    def __init__(self, options: RunOptions, input_folder: Path, list_files: Optional[Callable[[], list]] = None):
+        self.options = options
+        self.input_folder = Path(input_folder)
+        self.list_files = list_files or (lambda: sorted(self.input_folder.glob("*.tf")))
+        self.roots = options.input_roots or (self.input_folder,)
+        self.memo = BlockMemo()
+        self.lock = threading.Lock()
+
+    def warm_memo(self) -> BlockMemo:
+        if len(self.memo.entries) > DAEMON_MEMO_ENTRIES:
+            self.memo = BlockMemo()
+        return self.memo
+
+    def format_files(self, tf_files: list, check: bool = False, diff: bool = False) -> list:
+        with self.lock:
+            if check or diff:
+                return check_files(tf_files, replace(self.options, check=True, diff=diff))
+            return format_batch(tf_files, self.options, self.warm_memo())
+
+    def format_text(self, content: str, target: str = DEFAULT_CHECK_TARGET) -> str:
+        with self.lock:
+            if self.options.block_memo:
+                results, _ = run_pipeline_memoized([content], self.warm_memo(), self.options.stages,
+                                                   self.options.emit_intermediates)
+            else:
+                results = run_pipeline_batch([content], self.options.stages, self.options.emit_intermediates)
+        formatted = results[0].outputs[target]
+        if self.options.verify:
+            verify_text(content, formatted, target)
+        return formatted
+
+    def format_range(self, content: str, selection: dict, target: str = DEFAULT_CHECK_TARGET) -> list:
+        with self.lock:
+            edits = format_selection(content, selection.get("lines"), selection.get("bytes"),
+                                     selection.get("address"), self.options.stages, target)
+        if self.options.verify:
+            verify_text(content, apply_edits(content, edits), target)
+        return [asdict(edit) for edit in edits]
+
+    def handle(self, request: dict) -> dict:
+        """
+        Serves one client request:
+          {"content": text[, "target": stage]} -> {"formatted": text}, nothing is written
+          {"content": text, "lines" / "bytes": [start, end] or "address": address[, "target": stage]}
+            -> {"edits": [Edit, ...]} (see range_fmt), nothing is written
+          {"files": [path, ...][, "check": bool, "diff": bool]} -> {"reports": [FileReport, ...]}
+        An empty file list stands for every input file (see list_files). Failures are returned as {"error": message}.
+        """
+        started = time.perf_counter()
+        try:
+            if "content" in request and any(key in request for key in RANGE_KEYS):
+                response = {"edits": self.format_range(request["content"], request,
+                                                       request.get("target", DEFAULT_CHECK_TARGET))}
+            elif "content" in request:
+                response = {"formatted": self.format_text(request["content"],
+                                                          request.get("target", DEFAULT_CHECK_TARGET))}
+            else:
+                tf_files = [Path(name) for name in request.get("files", [])] or self.list_files()
+                reports = self.format_files(tf_files, request.get("check", False), request.get("diff", False))
+                response = {"reports": [asdict(report) for report in reports]}
+        except Exception as error:
+            response = {"error": describe_error(error)}
+        response["elapsed_ms"] = (time.perf_counter() - started) * 1000
+        return response
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """
+    One JSON request per line, answered with one JSON response per line.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                response = {"error": f"invalid request: {error}"}
+            else:
+                response = self.server.formatter.handle(request)
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class FormatServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, formatter: FormatDaemon):
+        self.formatter = formatter
+        super().__init__(str(socket_path), RequestHandler)
+
+
+def send_request(socket_path: Path, request: dict) -> dict:
+    """
+    Sends one request to the daemon listening on `socket_path` and returns its response.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(socket_path))
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with client.makefile("rb") as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError(f"no response from {socket_path}")
+    return json.loads(line)
+
+
+def daemon_running(socket_path: Path) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(socket_path))
+        return True
+    except OSError:
+        return False
+
+
+def print_reports(reports: list):
+    for report in reports:
+        print("\n".join(report.log), flush=True)
+
+
+def run_daemon(formatter: FormatDaemon, tf_files: list, socket_path: Path,
+               poll_interval: float = DEFAULT_POLL_INTERVAL) -> int:
+    """
+    Formats `tf_files` once, then keeps reformatting the input files (see FormatDaemon.list_files) as they
+    change and serves client requests on `socket_path`, until interrupted. A file or folder the watcher
+    reports that is not known yet makes the daemon list the input files again and watch any new folders.
+    """
+    socket_path = Path(socket_path)
+    if daemon_running(socket_path):
+        print(f"✘ A daemon is already listening on {socket_path}")
+        return 1
+    if socket_path.exists():
+        socket_path.unlink()
+
+    print_reports(formatter.format_files(tf_files))
+    server = FormatServer(socket_path, formatter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    known = set(formatter.list_files())
+    folders = watched_folders(formatter.roots, known)
+    watcher = open_watcher(folders, formatter.list_files)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"✔ Watching {len(folders)} folder(s) below {', '.join(str(root) for root in formatter.roots)} "
+          f"({watcher.kind}), listening on {socket_path}", flush=True)
+    try:
+        while True:
+            changed = watcher.changes(poll_interval)
+            if changed - known:
+                known = set(formatter.list_files())
+                folders = watched_folders(formatter.roots, known)
+                if formatter.options.input_roots:
+                    # New folders are still empty when they are reported, so they are watched for what comes
+                    folders |= set(Path(folder) for path in changed - known if path.is_dir()
+                                   for folder, _, _ in os.walk(path))
+                watcher.watch(folders)
+            changed = sorted(path for path in changed if path in known and path.is_file())
+            if changed:
+                print_reports(formatter.format_files(changed))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        watcher.close()
+        if socket_path.exists():
+            socket_path.unlink()
+    return 0
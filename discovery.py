@@ -0,0 +1,198 @@
+import os
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Directories never descended into: provider/module caches and VCS metadata
+PRUNED_DIRECTORIES = {".terraform", ".git"}
+
+IGNORE_FILE = ".gitignore"
+
+# Threads listing directories concurrently; they mostly wait on the file system
+DEFAULT_WALKERS = 8
+
+# Files handed to a worker at a time while the walk is still running, so formatting starts early
+DISCOVERY_BATCH_SIZE = 64
+
+
+def translate_pattern(pattern: str) -> str:
+    """
+    Regex for a gitignore glob: `*` and `?` stay within one path component, `**/` matches any number
+    of directories and a trailing `/**` everything inside a directory.
+    """
+    parts = []
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith("**/", index):
+            parts.append("(?:.*/)?")
+            index += 3
+            continue
+        if pattern.startswith("/**", index) and index + 3 == len(pattern):
+            parts.append("/.*")
+            index += 3
+            continue
+        char = pattern[index]
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[" and "]" in pattern[index + 2:]:
+            end = pattern.index("]", index + 2)
+            members = pattern[index + 1:end]
+            parts.append("[" + ("^" + members[1:] if members.startswith("!") else members) + "]")
+            index = end
+        elif char == "\\" and index + 1 < len(pattern):
+            index += 1
+            parts.append(re.escape(pattern[index]))
+        else:
+            parts.append(re.escape(char))
+        index += 1
+    return "".join(parts)
+
+
+class IgnoreRule:
+    """
+    One line of a `.gitignore`-style file, relative to the directory `base` ("" for the walk root).
+    """
+
+    def __init__(self, base: str, line: str):
+        self.base = base
+        self.negated = line.startswith("!")
+        pattern = line[1:] if self.negated else line
+        self.directory_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # A pattern with a slash is anchored to `base`; one without matches a name at any depth below it
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        self.regex = re.compile(("" if anchored else "(?:.*/)?") + translate_pattern(pattern) + r"\Z")
+
+    def match(self, relative: str, is_dir: bool) -> bool:
+        if self.directory_only and not is_dir:
+            return False
+        if self.base:
+            if not relative.startswith(self.base + "/"):
+                return False
+            relative = relative[len(self.base) + 1:]
+        return self.regex.match(relative) is not None
+
+
+def parse_rules(base: str, lines: list) -> list:
+    rules = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line.endswith("\\ "):
+            line = line.rstrip()
+        if line and not line.startswith("#"):
+            rules.append(IgnoreRule(base, line))
+    return rules
+
+
+def load_rules(directory: Path, base: str) -> list:
+    """
+    The rules of the IGNORE_FILE in `directory`, if there is one.
+    """
+    try:
+        with open(directory / IGNORE_FILE, encoding="utf-8") as ignore_file:
+            return parse_rules(base, ignore_file.readlines())
+    except OSError:
+        return []
+
+
+def is_ignored(rules: list, relative: str, is_dir: bool) -> bool:
+    """
+    Like git: the last matching rule decides, and a `!` rule re-includes what an earlier one excluded.
+    """
+    ignored = False
+    for rule in rules:
+        if rule.match(relative, is_dir):
+            ignored = not rule.negated
+    return ignored
+
+
+def discover(root: Path, excludes: list = (), walkers: int = DEFAULT_WALKERS, suffix: str = ".tf") -> Iterator[Path]:
+    """
+    Yields the files ending in `suffix` below `root`, as the walk finds them (in no particular order).
+    Directories are listed with os.scandir by up to `walkers` threads at once. The `.gitignore` files met on
+    the way and the `excludes` (gitignore-style patterns relative to `root`) are honoured, and
+    PRUNED_DIRECTORIES are never entered. Unreadable directories are skipped.
+    """
+    found = queue.Queue()
+    pending = [1]
+    lock = threading.Lock()
+    done = object()
+
+    def scan(directory: Path, relative: str, rules: list):
+        try:
+            rules = rules + load_rules(directory, relative)
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    entry_relative = f"{relative}/{entry.name}" if relative else entry.name
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if is_dir:
+                            if entry.name in PRUNED_DIRECTORIES or is_ignored(rules, entry_relative, True):
+                                continue
+                            with lock:
+                                pending[0] += 1
+                            executor.submit(scan, Path(entry.path), entry_relative, rules)
+                        elif entry.name.endswith(suffix) and entry.is_file() \
+                                and not is_ignored(rules, entry_relative, False):
+                            found.put(Path(entry.path))
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        finally:
+            with lock:
+                pending[0] -= 1
+                if pending[0] == 0:
+                    found.put(done)
+
+    with ThreadPoolExecutor(max_workers=max(walkers, 1), thread_name_prefix="discovery") as executor:
+        executor.submit(scan, Path(root), "", parse_rules("", list(excludes)))
+        while True:
+            path = found.get()
+            if path is done:
+                break
+            yield path
+
+
+def discover_inputs(paths: list, excludes: list = (), walkers: int = DEFAULT_WALKERS) -> Iterator[Path]:
+    """
+    The given files as they are, followed by everything discovered below the given directories.
+    """
+    directories = []
+    for path in paths:
+        if path.is_dir():
+            directories.append(path)
+        else:
+            yield path
+    for directory in directories:
+        yield from discover(directory, excludes, walkers)
+
+
+def stream_batches(paths, batch_size: int, collected: Optional[list] = None) -> Iterator[list]:
+    """
+    Groups an iterable of paths into sorted lists of `batch_size` while it is being produced, so that the
+    files of a batch come in the same order whichever walker thread found them first. Every path is also
+    appended to `collected`, in batch order, so the caller has the complete list once the batches are
+    exhausted.
+    """
+    batch = []
+    for path in paths:
+        batch.append(path)
+        if len(batch) == batch_size:
+            yield collect_batch(batch, collected)
+            batch = []
+    if batch:
+        yield collect_batch(batch, collected)
+
+
+def collect_batch(batch: list, collected: Optional[list]) -> list:
+    batch.sort()
+    if collected is not None:
+        collected.extend(batch)
+    return batch
@@ -0,0 +1,138 @@
+from dataclasses import replace
+from typing import Optional
+
+from .hcl_parser import Attribute, Block, parse, split_lines
+
+
+def shift_node(node, delta: int):
+    """
+    Moves a block or attribute (and everything nested in it) by `delta` lines.
+    """
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        node.start_line += delta
+        node.end_line += delta
+        if isinstance(node, Attribute):
+            for heredoc in node.heredocs:
+                heredoc.opener_line += delta
+                if heredoc.closer_line is not None:
+                    heredoc.closer_line += delta
+        else:
+            pending.extend(node.body)
+
+
+def shift_nodes_after(node, line: int, delta: int):
+    """
+    Moves every part of `node` that starts at or after `line` by `delta` lines; a node spanning `line` grows.
+    """
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        if node.start_line >= line:
+            shift_node(node, delta)
+            continue
+        if node.end_line < line:
+            continue
+        node.end_line += delta
+        if isinstance(node, Attribute):
+            for heredoc in node.heredocs:
+                if heredoc.opener_line >= line:
+                    heredoc.opener_line += delta
+                if heredoc.closer_line is not None and heredoc.closer_line >= line:
+                    heredoc.closer_line += delta
+        else:
+            pending.extend(node.body)
+
+
+def copy_tree(items: list) -> list:
+    """
+    A deep copy of a block/attribute tree, made with a stack rather than recursion like the walks above, so
+    deeply nested blocks cannot exceed the recursion limit.
+    """
+    copies = []
+    pending = [(items, copies)]
+    while pending:
+        nodes, target = pending.pop()
+        for node in nodes:
+            if isinstance(node, Attribute):
+                target.append(replace(node, heredocs=[replace(heredoc) for heredoc in node.heredocs]))
+            else:
+                duplicate = replace(node, labels=list(node.labels), body=[])
+                target.append(duplicate)
+                pending.append((node.body, duplicate.body))
+    return copies
+
+
+class Document:
+    """
+    A Terraform file parsed once and shared by every formatter stage.
+    Holds the lines, the block/attribute tree and the heredoc spans. Stages edit the lines in place and
+    keep the line spans of the tree up to date, so no stage has to split or parse the text again.
+    Character offsets on the tree nodes refer to the original text only. The text keeps the final line
+    break of the original, if it had one.
+    """
+
+    def __init__(self, content: str):
+        self.lines = split_lines(content)
+        self.items = parse(content)
+        self.final_newline = content.endswith("\n")
+
+    def text(self) -> str:
+        return "\n".join(self.lines) + ("\n" if self.final_newline and self.lines else "")
+
+    def copy(self) -> "Document":
+        duplicate = Document.__new__(Document)
+        duplicate.lines = list(self.lines)
+        duplicate.final_newline = self.final_newline
+        duplicate.items = copy_tree(self.items)
+        return duplicate
+
+    def replace_lines(self, start: int, end: int, new_lines: list):
+        """
+        Replaces lines[start:end] with `new_lines` and moves the tree spans after them accordingly.
+        """
+        delta = len(new_lines) - (end - start)
+        self.lines[start:end] = new_lines
+        if delta:
+            for item in self.items:
+                shift_nodes_after(item, end, delta)
+
+    def blocks(self, block_type: Optional[str] = None) -> list:
+        """
+        Top-level blocks, optionally only those of `block_type` (e.g. "resource").
+        """
+        return [item for item in self.items
+                if isinstance(item, Block) and (block_type is None or item.type == block_type)]
+
+    def heredocs(self) -> list:
+        """
+        Every heredoc in the document, in source order.
+        """
+        found = []
+        pending = list(reversed(self.items))
+        while pending:
+            node = pending.pop()
+            if isinstance(node, Attribute):
+                found.extend(node.heredocs)
+            else:
+                pending.extend(reversed(node.body))
+        return found
+
+    def heredoc_body_lines(self) -> set:
+        """
+        Line numbers inside heredoc bodies (between the opener and the closing delimiter).
+        """
+        body_lines = set()
+        for heredoc in self.heredocs():
+            closer_line = heredoc.closer_line if heredoc.closer_line is not None else len(self.lines)
+            body_lines.update(range(heredoc.opener_line + 1, closer_line))
+        return body_lines
+
+
+def as_document(value) -> Document:
+    return value if isinstance(value, Document) else Document(value)
+
+
+def as_text(value) -> str:
+    return value.text() if isinstance(value, Document) else value
@@ -2,8 +2,9 @@ import re
 import sys
 from pathlib import Path
 
-# Desired property order
-PROPERTY_ORDER = ["display_name", "description", "name", "severity", "tactics", "query"]
+from hcl_parser import body_statements, find_resource_spans, replace_spans
+from ordering import header_resource_type, order_properties
+from output import write_if_changed
 
 def format_terraform_file(input_file: str, output_file: str = None):
     path = Path(input_file)
@@ -21,72 +22,48 @@ def format_terraform_file(input_file: str, output_file: str = None):
         header = lines[0]  # resource "type" "name" {
         footer = lines[-1]  # closing }
 
-        body = lines[1:-1]  # everything in between
-
         top_level_props = {}
         other_lines = []
-
-        i = 0
-        while i < len(body):
-            line = body[i]
-            stripped = line.strip()
-
-            # Detect top-level key=value (non-nested)
-            if "=" in stripped and not stripped.startswith("#") and not re.match(r'\s+\S', line):
-                key = stripped.split("=")[0].strip()
-
-                # Handle query heredoc specially
-                if key == "query" and re.search(r'<<-?[A-Za-z0-9_]+', line):
-                    heredoc_tag = re.search(r'<<-?([A-Za-z0-9_]+)', line).group(1)
-                    heredoc_lines = []
-                    i += 1
-                    while i < len(body) and not body[i].strip() == heredoc_tag:
-                        heredoc_lines.append(body[i])
-                        i += 1
-                    heredoc_lines.append(body[i])  # closing tag
-
-                    # Indent heredoc content by 2 spaces relative to property line
-                    indent = "  "
-                    indented_heredoc = [line]  # the `query = <<-TAG` line itself
-                    for l in heredoc_lines[0:-1]:
-                        if l.strip():
-                            indented_heredoc.append(indent + l)
-                        else:
-                            indented_heredoc.append(l)
-                    indented_heredoc.append(heredoc_lines[-1])  # closing tag
-
-                    top_level_props[key] = "\n".join(indented_heredoc)
-                else:
-                    top_level_props[key] = line
+        for key, statement in body_statements(block):
+            # Top-level key=value statements; nested blocks, comments and blank lines stay as they are
+            if key is None:
+                other_lines.extend(statement)
+
+            # Handle query heredoc specially
+            elif key == "query" and len(statement) > 1 and re.search(r'<<-?[A-Za-z0-9_]+', statement[0]):
+                # Indent heredoc content by 2 spaces relative to property line
+                indent = "  "
+                indented_heredoc = [statement[0]]  # the `query = <<-TAG` line itself
+                for l in statement[1:-1]:
+                    if l.strip():
+                        indented_heredoc.append(indent + l)
+                    else:
+                        indented_heredoc.append(l)
+                indented_heredoc.append(statement[-1])  # closing tag
+
+                top_level_props[key] = "\n".join(indented_heredoc)
             else:
-                other_lines.append(line)
-            i += 1
+                top_level_props[key] = "\n".join(statement)
 
         # Reorder top-level properties
-        ordered_lines = []
-        for key in PROPERTY_ORDER:
-            if key in top_level_props:
-                ordered_lines.append(top_level_props[key])
-        for k, v in top_level_props.items():
-            if k not in PROPERTY_ORDER:
-                ordered_lines.append(v)
+        resource_type = header_resource_type(header)
+        ordered_lines = [top_level_props[key] for key in order_properties(list(top_level_props), resource_type)]
 
         # Combine with other lines (nested blocks, comments)
         final_body = ordered_lines + other_lines
 
         return "\n".join([header] + final_body + [footer])
 
-    resource_pattern = re.compile(r'resource\s+".+?"\s+".+?"\s*{[^}]*}', re.DOTALL)
-    text = resource_pattern.sub(process_resource, text)
+    text = replace_spans(text, find_resource_spans(text), process_resource)
 
     # --- Step 2: Add '-' to all heredocs (including query if not already) ---
     text = re.sub(r'(<<)([A-Za-z0-9_]+)', r'\1-\2', text)
 
     # --- Step 3: Save result ---
     if output_file:
-        Path(output_file).write_text(text)
+        write_if_changed(output_file, text)
     else:
-        path.write_text(text)
+        write_if_changed(path, text)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,445 @@
+import re
+from dataclasses import dataclass, field
+from typing import NamedTuple, Optional
+
+# One alternative per token kind. Strings and heredocs only match their opening marker here;
+# their bodies are scanned by hand so braces inside them never count towards nesting.
+TOKEN_PATTERN = re.compile(r"""
+    (?P<newline>\n)
+  | (?P<space>[ \t\r\f\v]+)
+  | (?P<comment>\#[^\n]*|//[^\n]*|/\*(?:.*?\*/|.*))
+  | (?P<heredoc><<(?P<indent>-?)(?P<delimiter>[A-Za-z_][A-Za-z0-9_-]*)[ \t\r]*\n)
+  | (?P<string>")
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_-]*)
+  | (?P<op>==|!=|<=|>=|&&|\|\||=>|\.\.\.|[=+\-*/%<>!?:.,])
+  | (?P<lbrace>\{) | (?P<rbrace>\}) | (?P<lbrack>\[) | (?P<rbrack>\]) | (?P<lparen>\() | (?P<rparen>\))
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+STRING_SPECIAL = re.compile(r'["\\\n$%]')
+
+# Token kinds whose text may span lines (a string only through a multi-line `${ ... }`)
+MULTILINE_KINDS = {"string", "comment", "heredoc"}
+
+OPENING = {"lbrace": "rbrace", "lbrack": "rbrack", "lparen": "rparen"}
+CLOSING = set(OPENING.values())
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+    start: int
+    line: int
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.text)
+
+    @property
+    def end_line(self) -> int:
+        return self.line + self.text.count("\n")
+
+
+def _scan_string(text: str, pos: int) -> int:
+    """
+    Returns the offset just past the closing quote of the string whose opening quote is at `pos`.
+    An unterminated string stops at the end of its line. `${ ... }` / `%{ ... }` sequences, and strings
+    nested inside them, are tracked on an explicit stack (one brace depth per open sequence), so deeply
+    nested input cannot exhaust the recursion limit.
+    """
+    interpolations = []
+    in_string = True
+    pos += 1
+    while pos < len(text):
+        if not in_string:
+            kind, end = _next_interpolation_token(text, pos)
+            if kind == "string":
+                in_string = True
+            elif kind == "lbrace":
+                interpolations[-1] += 1
+            elif kind == "rbrace":
+                if interpolations[-1] == 0:
+                    interpolations.pop()
+                    in_string = True
+                else:
+                    interpolations[-1] -= 1
+            pos = end
+            continue
+
+        match = STRING_SPECIAL.search(text, pos)
+        if match is None:
+            return len(text)
+        char = match.group()
+        pos = match.end()
+        if char == '"':
+            if not interpolations:
+                return pos
+            in_string = False
+        elif char == "\n":
+            if not interpolations:
+                return pos - 1
+            pos -= 1
+            in_string = False
+        elif char == "\\":
+            pos += 1
+        elif text.startswith("{", pos):
+            if text[match.start() - 1:match.start()] == char:  # $${ and %%{ are literal
+                pos += 1
+            else:
+                interpolations.append(0)
+                in_string = False
+                pos += 1
+    return pos
+
+
+def _next_interpolation_token(text: str, pos: int):
+    """
+    Like _next_token, but a string only consumes its opening quote: its body is scanned by _scan_string.
+    """
+    match = TOKEN_PATTERN.match(text, pos)
+    if match.lastgroup == "string":
+        return "string", match.end()
+    return _next_token(text, pos)
+
+
+def _scan_heredoc(text: str, pos: int, delimiter: str) -> int:
+    """
+    Returns the offset at the end of the closing delimiter line of a heredoc whose body starts at `pos`.
+    An unterminated heredoc runs to the end of the text.
+    """
+    while pos < len(text):
+        line_end = text.find("\n", pos)
+        if line_end == -1:
+            line_end = len(text)
+        if text[pos:line_end].strip() == delimiter:
+            return line_end
+        pos = line_end + 1
+    return len(text)
+
+
+def _next_token(text: str, pos: int):
+    match = TOKEN_PATTERN.match(text, pos)
+    kind = match.lastgroup
+    if kind == "string":
+        return kind, _scan_string(text, pos)
+    if kind == "heredoc":
+        return kind, _scan_heredoc(text, match.end(), match.group("delimiter"))
+    return kind, match.end()
+
+
+def tokenize(text: str, keep_space: bool = False) -> list:
+    """
+    Splits HCL source into tokens in a single linear pass. Strings (including `${...}` interpolations),
+    comments and heredocs each come out as one token, so braces inside them never affect nesting.
+    """
+    tokens = []
+    append = tokens.append
+    match_token = TOKEN_PATTERN.match
+    make = tuple.__new__  # Token(...) without the Python-level NamedTuple constructor
+    pos = 0
+    line = 0
+    length = len(text)
+    while pos < length:
+        match = match_token(text, pos)
+        kind = match.lastgroup
+        if kind == "newline":
+            append(make(Token, (kind, "\n", pos, line)))
+            line += 1
+            pos += 1
+            continue
+        if kind == "string":
+            end = _scan_string(text, pos)
+        elif kind == "heredoc":
+            end = _scan_heredoc(text, match.end(), match.group("delimiter"))
+        else:
+            end = match.end()
+        if keep_space or kind != "space":
+            token_text = text[pos:end]
+            append(make(Token, (kind, token_text, pos, line)))
+            if kind in MULTILINE_KINDS:
+                line += token_text.count("\n")
+        pos = end
+    return tokens
+
+
+@dataclass
+class Heredoc:
+    """
+    A heredoc value. `opener_line` holds the `<<DELIM` marker, `closer_line` the closing delimiter
+    (None when the heredoc is never closed).
+    """
+    delimiter: str
+    indented: bool
+    opener_line: int
+    closer_line: Optional[int]
+
+
+@dataclass
+class Attribute:
+    name: str
+    start_line: int
+    end_line: int
+    start: int
+    end: int
+    heredocs: list = field(default_factory=list)
+
+
+@dataclass
+class Block:
+    type: str
+    labels: list
+    start_line: int
+    end_line: int
+    start: int
+    end: int
+    body: list = field(default_factory=list)
+
+    @property
+    def address(self) -> str:
+        """
+        Terraform style address: `tfe_policy.example` for `resource "tfe_policy" "example"`,
+        `data.x.y` for data sources and the type plus labels for everything else.
+        """
+        parts = self.labels if self.type == "resource" else [self.type] + self.labels
+        return ".".join(parts)
+
+    def attributes(self) -> list:
+        return [item for item in self.body if isinstance(item, Attribute)]
+
+    def blocks(self) -> list:
+        return [item for item in self.body if isinstance(item, Block)]
+
+
+def _unquote(token: Token) -> str:
+    return token.text[1:-1] if token.kind == "string" else token.text
+
+
+class Parser:
+    """
+    Builds a lightweight tree of blocks and attributes from the token stream. The parser is tolerant:
+    anything it does not recognise is skipped up to the end of the line, and unclosed blocks end at EOF.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> Optional[Token]:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def parse(self) -> list:
+        """
+        The top-level items. The blocks being parsed are kept on a stack rather than in recursive calls, so
+        deeply nested or never closed blocks cannot exceed the recursion limit.
+        """
+        items = []
+        open_blocks = []
+        body = items
+        while self.pos < len(self.tokens):
+            token = self.tokens[self.pos]
+            if token.kind in ("newline", "comment"):
+                self.pos += 1
+            elif token.kind == "rbrace":
+                self.pos += 1
+                if open_blocks:
+                    block = open_blocks.pop()
+                    block.end_line, block.end = token.line, token.end
+                    body = open_blocks[-1].body if open_blocks else items
+            elif token.kind == "ident" and self.peek(1) is not None and self.peek(1).text == "=":
+                body.append(self.parse_attribute())
+            elif token.kind == "ident":
+                block = self.parse_block_header()
+                if block is not None:
+                    body.append(block)
+                    open_blocks.append(block)
+                    body = block.body
+            else:
+                self.skip_line()
+
+        # Unclosed blocks end at EOF
+        for block in open_blocks:
+            block.end_line, block.end = self.tokens[-1].end_line, len(self.text)
+        return items
+
+    def parse_attribute(self) -> Attribute:
+        name = self.tokens[self.pos]
+        self.pos += 2
+        heredocs = []
+        depth = 0
+        last = name
+        while self.pos < len(self.tokens):
+            token = self.tokens[self.pos]
+            if depth == 0 and (token.kind == "newline" or token.kind == "rbrace"):
+                break
+            if token.kind in OPENING:
+                depth += 1
+            elif token.kind in CLOSING:
+                depth -= 1
+            elif token.kind == "heredoc":
+                heredocs.append(self.make_heredoc(token))
+            if token.kind != "comment":
+                last = token
+            self.pos += 1
+        return Attribute(name.text, name.line, last.end_line, name.start, last.end, heredocs)
+
+    def make_heredoc(self, token: Token) -> Heredoc:
+        match = TOKEN_PATTERN.match(token.text)
+        delimiter = match.group("delimiter")
+        closed = token.text.rstrip("\n").rsplit("\n", 1)[-1].strip() == delimiter
+        return Heredoc(delimiter, bool(match.group("indent")), token.line, token.end_line if closed else None)
+
+    def parse_block_header(self) -> Optional[Block]:
+        """
+        A Block for the header at the current token, up to and including its `{`; parse fills in its body
+        and end. None (with the line skipped) if the header is not followed by `{`.
+        """
+        type_token = self.tokens[self.pos]
+        labels = []
+        index = self.pos + 1
+        while index < len(self.tokens) and self.tokens[index].kind in ("string", "ident"):
+            labels.append(_unquote(self.tokens[index]))
+            index += 1
+        if index >= len(self.tokens) or self.tokens[index].kind != "lbrace":
+            self.skip_line()
+            return None
+        self.pos = index + 1
+        return Block(type_token.text, labels, type_token.line, type_token.line, type_token.start, type_token.start)
+
+    def skip_line(self):
+        self.pos += 1
+        while self.pos < len(self.tokens) and self.tokens[self.pos].kind != "newline":
+            self.pos += 1
+
+
+def split_lines(text: str) -> list:
+    """
+    Splits text into lines the same way the tokenizer numbers them (on "\n", dropping a trailing "\r").
+    """
+    lines = text.replace("\r\n", "\n").split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def parse(text: str) -> list:
+    """
+    Parses HCL source into a list of top-level Blocks and Attributes.
+    """
+    return Parser(text).parse()
+
+
+def body_statements(block_text: str) -> list:
+    """
+    The lines between the header and the closing line of a block (e.g. a find_resource_spans match), grouped
+    into statements: (name, lines) for a top-level attribute, with every line of a multi-line value or heredoc,
+    and (None, lines) for a nested block, a comment or a blank line.
+    """
+    lines = block_text.split("\n")
+    items = parse(block_text)
+    if not items or not isinstance(items[0], Block):
+        return [(None, [line]) for line in lines[1:-1]]
+    block = items[0]
+    statements = []
+    line_number = block.start_line + 1
+    children = iter(block.body)
+    child = next(children, None)
+    while line_number < block.end_line:
+        # Skip items sharing the header line or a line with the previous item
+        while child is not None and child.start_line < line_number:
+            child = next(children, None)
+        if child is not None and child.start_line == line_number:
+            end_line = min(child.end_line, block.end_line - 1)
+            statements.append((child.name if isinstance(child, Attribute) else None,
+                               lines[line_number:end_line + 1]))
+            line_number = end_line + 1
+        else:
+            statements.append((None, [lines[line_number]]))
+            line_number += 1
+    return statements
+
+
+class SpanMatch(NamedTuple):
+    """
+    A span found by find_resource_spans / find_heredoc_spans. It can stand in for the re.Match of the
+    patterns they replace: group(0) is the whole span and group(1), group(2), ... its parts.
+    """
+    start: int
+    end: int
+    parts: tuple
+
+    def group(self, index: int = 0) -> str:
+        return self.parts[index]
+
+
+def find_resource_spans(text: str) -> list:
+    """
+    Spans of the top-level `resource "type" "name" { ... }` blocks, from the `resource` keyword up to and
+    including the matching `}`. Nested blocks, and braces in strings, comments and heredocs, are handled;
+    unclosed blocks are left out. Runs in a single linear pass over the tokens.
+    """
+    spans = []
+    tokens = [token for token in tokenize(text) if token.kind not in ("newline", "comment")]
+    depth = 0
+    start = None
+    for index, token in enumerate(tokens):
+        if token.kind in OPENING:
+            if depth == 0 and index >= 3 and tokens[index - 3].text == "resource" \
+                    and tokens[index - 2].kind == "string" and tokens[index - 1].kind == "string":
+                start = tokens[index - 3].start
+            depth += 1
+        elif token.kind in CLOSING:
+            depth = max(depth - 1, 0)
+            if depth == 0 and start is not None:
+                spans.append(SpanMatch(start, token.end, (text[start:token.end],)))
+                start = None
+    return spans
+
+
+def find_heredoc_spans(text: str, indented: Optional[bool] = None) -> list:
+    """
+    Spans of the closed heredocs, each from the start of its opener line to the end of its closing delimiter.
+    The parts are (line up to and including `<<` or `<<-`, delimiter, body, closing line up to the delimiter),
+    matching the groups of the `(^\\s*.*<<-?)(TAG)\\n(.*?\\n)(\\s*\\2)` pattern used before.
+    `indented` restricts the result to `<<-` (True) or plain `<<` (False) heredocs.
+    Unterminated heredocs are left out. Runs in a single linear pass.
+    """
+    spans = []
+    for token in tokenize(text):
+        if token.kind != "heredoc":
+            continue
+        match = TOKEN_PATTERN.match(text, token.start)
+        if indented is not None and bool(match.group("indent")) != indented:
+            continue
+        closer_start = token.text.rstrip("\n").rfind("\n") + 1
+        closer = token.text[closer_start:]
+        if closer_start == 0 or closer.strip() != match.group("delimiter"):
+            continue
+        line_start = text.rfind("\n", 0, token.start) + 1
+        closer = closer[:len(closer) - len(closer.lstrip()) + len(match.group("delimiter"))]
+        body = token.text[match.end() - token.start:closer_start]
+        end = token.start + closer_start + len(closer)
+        spans.append(SpanMatch(line_start, end, (
+            text[line_start:end],
+            text[line_start:match.start("delimiter")],
+            match.group("delimiter"),
+            body,
+            closer,
+        )))
+    return spans
+
+
+def replace_spans(text: str, spans: list, replace) -> str:
+    """
+    Replaces every span with `replace(span)`, like `pattern.sub(replace, text)` does for matches.
+    """
+    parts = []
+    pos = 0
+    for span in spans:
+        parts.append(text[pos:span.start])
+        parts.append(replace(span))
+        pos = span.end
+    parts.append(text[pos:])
+    return "".join(parts)
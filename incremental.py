@@ -0,0 +1,54 @@
+import json
+import subprocess
+from pathlib import Path
+
+
+def git_changed_files(revision_range: str, input_folder: Path) -> list:
+    """
+    `.tf` files under `input_folder` touched by `revision_range`. A single revision (e.g. `HEAD`) is compared
+    against the working tree, so staged and unstaged edits are both included; `A..B` compares two commits.
+    Deleted files are left out.
+    """
+    top_level = subprocess.run(["git", "rev-parse", "--show-toplevel"],
+                               check=True, capture_output=True, text=True).stdout.strip()
+    completed = subprocess.run(
+        ["git", "diff", "--name-only", "--diff-filter=d", revision_range, "--", str(input_folder)],
+        check=True, capture_output=True, text=True,
+    )
+    changed = []
+    for name in completed.stdout.splitlines():
+        path = Path(top_level) / name
+        if path.suffix == ".tf" and path.is_file():
+            changed.append(path)
+    return changed
+
+
+def file_signature(path: Path) -> list:
+    stat = path.stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def load_manifest(manifest_file: Path) -> dict:
+    """
+    Reads the mtime/size manifest written by a previous run ({path: [mtime_ns, size]}); empty if missing.
+    """
+    try:
+        return json.loads(manifest_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def is_changed(tf_file: Path, manifest: dict) -> bool:
+    """
+    Whether the mtime or size of `tf_file` differs from the manifest, or the manifest does not know it yet.
+    """
+    return manifest.get(str(tf_file)) != file_signature(tf_file)
+
+
+def save_manifest(manifest_file: Path, manifest: dict, tf_files: list):
+    """
+    Records the current mtime/size of `tf_files` (on top of the previous `manifest`) for the next run.
+    """
+    for tf_file in tf_files:
+        manifest[str(tf_file)] = file_signature(tf_file)
+    manifest_file.write_text(json.dumps(manifest, indent=0, sort_keys=True), encoding="utf-8")
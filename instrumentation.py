@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from .document import Document, as_document, as_text
+
+# Seconds each thread has spent waiting on external formatter processes (stages may run on worker threads)
+_subprocess_time = threading.local()
+
+
+def subprocess_seconds() -> float:
+    return getattr(_subprocess_time, "seconds", 0.0)
+
+
+@contextmanager
+def timed_subprocess():
+    """
+    Wrap every external process call with this so stage metrics can tell subprocess time apart.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _subprocess_time.seconds = subprocess_seconds() + time.perf_counter() - start
+
+
+@dataclass
+class StageMetrics:
+    """
+    What one stage cost on one file. For batch stages the time fields are the file's even share of the batch.
+    """
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    subprocess_seconds: float = 0.0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    lines_in: int = 0
+    lines_out: int = 0
+    heredocs: int = 0
+    peak_memory: Optional[int] = None
+    started_at: float = 0.0
+    pid: int = 0
+    thread: int = 0
+
+
+def content_stats(value) -> tuple:
+    """
+    (bytes, lines, heredocs) of a stage input or output, which may be text or a Document.
+    """
+    text = as_text(value)
+    lines = len(value.lines) if isinstance(value, Document) else text.count("\n") + 1
+    return len(text.encode("utf-8")), lines, len(as_document(value).heredocs())
+
+
+class StageProbe:
+    """
+    Measures one stage run. Wall time is always measured; with `profile` the CPU time, subprocess time,
+    input/output sizes and (with `trace_memory`) the tracemalloc peak are recorded as well.
+    CPU and subprocess time are those of the calling thread; the memory peak is process-wide,
+    so it also covers any stage running concurrently. The input is measured up front because
+    document stages edit it in place.
+    """
+
+    def __init__(self, profile: bool = False, trace_memory: bool = False, stage_input=None):
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.input_stats = content_stats(stage_input) if profile and stage_input is not None else None
+        self.wall_seconds = 0.0
+
+    def __enter__(self):
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        self.started_at = time.time()
+        self.cpu_start = time.thread_time()
+        self.subprocess_start = subprocess_seconds()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall_seconds = time.perf_counter() - self.wall_start
+        self.cpu_seconds = time.thread_time() - self.cpu_start
+        self.subprocess_seconds = subprocess_seconds() - self.subprocess_start
+        self.peak_memory = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+        return False
+
+    def metrics(self, stage_input, stage_output, share: int = 1) -> StageMetrics:
+        bytes_in, lines_in, _ = self.input_stats if self.input_stats is not None else content_stats(stage_input)
+        bytes_out, lines_out, heredocs = content_stats(stage_output)
+        return StageMetrics(self.wall_seconds / share, self.cpu_seconds / share, self.subprocess_seconds / share,
+                            bytes_in, bytes_out, lines_in, lines_out, heredocs, self.peak_memory,
+                            self.started_at, os.getpid(), threading.get_ident())
+
+
+def aggregate(file_metrics: dict) -> dict:
+    """
+    Sums the per-file metrics ({file: {stage: StageMetrics}}) into one StageMetrics per stage.
+    """
+    totals = {}
+    for stages in file_metrics.values():
+        for stage_name, metrics in stages.items():
+            total = totals.setdefault(stage_name, StageMetrics())
+            for name in ("wall_seconds", "cpu_seconds", "subprocess_seconds", "bytes_in", "bytes_out",
+                         "lines_in", "lines_out", "heredocs"):
+                setattr(total, name, getattr(total, name) + getattr(metrics, name))
+            if metrics.peak_memory is not None:
+                total.peak_memory = max(total.peak_memory or 0, metrics.peak_memory)
+            if not total.started_at or metrics.started_at < total.started_at:
+                total.started_at, total.pid, total.thread = metrics.started_at, metrics.pid, metrics.thread
+    return totals
+
+
+def format_table(stages: dict) -> list:
+    rows = [f"  {'stage':<35} {'wall ms':>10} {'cpu ms':>10} {'subproc ms':>10} {'bytes in':>10} "
+            f"{'bytes out':>10} {'lines':>8} {'heredocs':>8} {'peak KiB':>9}"]
+    for stage_name, metrics in stages.items():
+        peak = f"{metrics.peak_memory / 1024:9.1f}" if metrics.peak_memory is not None else f"{'-':>9}"
+        rows.append(f"  {stage_name:<35} {metrics.wall_seconds * 1000:10.2f} {metrics.cpu_seconds * 1000:10.2f} "
+                    f"{metrics.subprocess_seconds * 1000:10.2f} {metrics.bytes_in:10d} {metrics.bytes_out:10d} "
+                    f"{metrics.lines_in:8d} {metrics.heredocs:8d} {peak}")
+    return rows
+
+
+def print_profile(file_metrics: dict):
+    for file_name, stages in file_metrics.items():
+        print(f"Profile: {file_name}")
+        print("\n".join(format_table(stages)))
+    print(f"Profile: all {len(file_metrics)} file(s)")
+    print("\n".join(format_table(aggregate(file_metrics))))
+
+
+def write_profile_json(path: Path, file_metrics: dict):
+    report = {
+        "files": dict((file_name, dict((stage_name, asdict(metrics)) for stage_name, metrics in stages.items()))
+                      for file_name, stages in file_metrics.items()),
+        "aggregate": dict((stage_name, asdict(metrics)) for stage_name, metrics in aggregate(file_metrics).items()),
+    }
+    path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+def write_chrome_trace(path: Path, file_metrics: dict):
+    """
+    Writes the stage runs as Chrome trace "complete" events (load in chrome://tracing or Perfetto).
+    Each worker process and stage thread shows up as its own track.
+    """
+    events = []
+    for file_name, stages in file_metrics.items():
+        for stage_name, metrics in stages.items():
+            events.append({
+                "name": stage_name,
+                "cat": "stage",
+                "ph": "X",
+                "ts": metrics.started_at * 1e6,
+                "dur": metrics.wall_seconds * 1e6,
+                "pid": metrics.pid,
+                "tid": metrics.thread,
+                "args": dict(asdict(metrics), file=file_name),
+            })
+    path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf-8")
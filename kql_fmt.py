@@ -0,0 +1,236 @@
+import re
+from functools import lru_cache
+from typing import Optional
+
+from .document import Document
+from .native_fmt import SPACES_PER_INDENT
+
+# `query` attributes of these resource types hold KQL
+KQL_RESOURCE_PREFIXES = ("azurerm_sentinel_", "azurerm_log_analytics_")
+KQL_ATTRIBUTES = {"query"}
+
+# Operator parameters written as `name=value`, e.g. `join kind=inner`; these `=` are not spaced
+KQL_PARAMETERS = {"kind", "withsource", "isfuzzy", "bagexpansion", "with_itemindex", "with_source", "decodeblocks"}
+
+# Distinct query bodies kept formatted per process; repeated queries are only formatted once
+KQL_CACHE_SIZE = 4096
+
+KQL_TOKEN = re.compile(r"""
+    (?P<space>[ \t\r\f\v]+)
+  | (?P<comment>//.*)
+  | (?P<interpolation>[$%]\{)
+  | (?P<string>@"[^"]*"|@'[^']*'|"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<op>==|!=|=~|!~|<=|>=|<>|=>|[=<>])
+  | (?P<comma>,)
+  | (?P<pipe>\|)
+  | (?P<open>[(\[{])
+  | (?P<close>[)\]}])
+  | (?P<word>!?[^\s"'(),\[\]{}|=<>!/$%]+|[!/$%])
+""", re.VERBOSE)
+
+
+class KqlToken:
+    __slots__ = ("kind", "text", "space_before")
+
+    def __init__(self, kind: str, text: str, space_before: bool):
+        self.kind = kind
+        self.text = text
+        self.space_before = space_before
+
+
+def _scan_interpolation(line: str, pos: int) -> Optional[int]:
+    """
+    End of the Terraform `${ ... }` / `%{ ... }` sequence whose `{` is at `pos`; None if it is not closed on the line.
+    """
+    depth = 0
+    for index in range(pos, len(line)):
+        if line[index] == "{":
+            depth += 1
+        elif line[index] == "}":
+            depth -= 1
+            if depth == 0:
+                return index + 1
+    return None
+
+
+def tokenize_kql(line: str) -> Optional[list]:
+    """
+    Splits one KQL line into tokens; None if the line cannot be tokenized (e.g. an unterminated string).
+    Terraform interpolations are kept as single opaque tokens.
+    """
+    tokens = []
+    pos = 0
+    space = False
+    while pos < len(line):
+        match = KQL_TOKEN.match(line, pos)
+        if match is None:
+            return None
+        kind = match.lastgroup
+        end = match.end()
+        if kind == "space":
+            space = True
+            pos = end
+            continue
+        if kind == "interpolation":
+            end = _scan_interpolation(line, pos + 1)
+            if end is None:
+                return None
+            kind = "word"
+        tokens.append(KqlToken(kind, line[pos:end], space))
+        space = False
+        pos = end
+    return tokens
+
+
+def split_pipes(lines: list) -> Optional[list]:
+    """
+    Tokenizes every line and moves each `|` that is not inside brackets to the start of its own line.
+    A `|` ending a line (`SecurityEvent |`) is moved to the start of the next operator line instead.
+    Returns token lists (an empty list for a blank line); None if the body is not well-formed.
+    """
+    result = []
+    depth = 0
+    carried = []  # a trailing `|` waiting for the next operator
+    for line in lines:
+        tokens = tokenize_kql(line)
+        if tokens is None:
+            return None
+        if carried and (not tokens or tokens[0].kind == "comment"):
+            result.append(tokens)
+            continue
+        current = carried
+        carried = []
+        for token in tokens:
+            if token.kind == "pipe" and depth == 0 and current:
+                result.append(current)
+                current = []
+            if token.kind == "open":
+                depth += 1
+            elif token.kind == "close":
+                depth -= 1
+                if depth < 0:
+                    return None
+            current.append(token)
+        if depth == 0 and len(current) == 1 and current[0].kind == "pipe":
+            carried = current
+        else:
+            result.append(current)
+    if carried:
+        result.append(carried)
+    return result if depth == 0 else None
+
+
+def is_parameter(tokens: list, index: int) -> bool:
+    """
+    Whether tokens[index] is the `=` of an operator parameter such as `kind=inner` or `hint.strategy=shuffle`.
+    """
+    if index == 0 or tokens[index].text != "=":
+        return False
+    name = tokens[index - 1].text
+    return name in KQL_PARAMETERS or name.startswith("hint.")
+
+
+def render_tokens(tokens: list) -> str:
+    """
+    Joins the tokens of one line: one space around comparison/assignment operators, after commas and
+    after a leading pipe, none inside brackets or before commas; elsewhere whitespace is collapsed to one space.
+    """
+    parts = []
+    previous = None
+    for index, token in enumerate(tokens):
+        if previous is not None:
+            if token.kind == "comma" or previous.kind == "open" or token.kind == "close" \
+                    or is_parameter(tokens, index) or is_parameter(tokens, index - 1):
+                space = False
+            elif token.kind in ("op", "pipe", "comment") or previous.kind in ("op", "comma", "pipe"):
+                space = True
+            else:
+                space = token.space_before
+            if space:
+                parts.append(" ")
+        parts.append(token.text)
+        previous = token
+    return "".join(parts)
+
+
+@lru_cache(maxsize=KQL_CACHE_SIZE)
+def format_kql(body: str) -> Optional[str]:
+    """
+    Formats a KQL query, without any base indentation:
+      - every top-level `| operator` starts its own line
+      - lines are indented 2 spaces per open bracket, continuation lines one extra level
+      - one space around comparison and assignment operators and after commas
+    String literals, comments and Terraform interpolations are left as they are.
+    Returns None for bodies that cannot be formatted safely (unterminated strings or brackets, ``` literals).
+    """
+    if "```" in body:
+        return None
+    lines = split_pipes(body.split("\n"))
+    if lines is None:
+        return None
+
+    output = []
+    depth = 0
+    statement_start = True
+    indent = " " * SPACES_PER_INDENT
+    for tokens in lines:
+        if not tokens:
+            output.append("")
+            statement_start = True
+            continue
+        line_depth = depth
+        for token in tokens:
+            if token.kind == "open":
+                depth += 1
+            elif token.kind == "close":
+                depth -= 1
+        leading = tokens[0].kind
+        if leading == "close":
+            line_depth -= 1
+        continuation = not (statement_start or leading in ("pipe", "close", "comment"))
+        output.append(indent * (line_depth + continuation) + render_tokens(tokens))
+        if leading != "comment":
+            statement_start = tokens[-1].kind == "open" or tokens[-1].text.endswith(";")
+    return "\n".join(output)
+
+
+def kql_heredocs(document: Document) -> list:
+    """
+    The heredocs of the KQL_ATTRIBUTES of every KQL_RESOURCE_PREFIXES resource, in source order.
+    """
+    found = []
+    for block in document.blocks("resource"):
+        if not block.labels or not block.labels[0].startswith(KQL_RESOURCE_PREFIXES):
+            continue
+        for attribute in block.attributes():
+            if attribute.name in KQL_ATTRIBUTES:
+                found.extend(attribute.heredocs)
+    return found
+
+
+def format_kql_queries(content: str) -> str:
+    """
+    Formats the KQL in the `query` heredocs of Sentinel / Log Analytics resources.
+    """
+    document = Document(content)
+    format_kql_queries_document(document)
+    return document.text()
+
+
+def format_kql_queries_document(document: Document):
+    """
+    Formats the KQL in the `query` heredocs of `document`, in place. Bodies are indented one level deeper
+    than the attribute will be after `terraform fmt`; only indented (<<-) heredocs are touched, as their
+    common leading whitespace is stripped by Terraform.
+    """
+    base_indent = " " * (SPACES_PER_INDENT * 2)
+    for heredoc in reversed(kql_heredocs(document)):
+        if heredoc.closer_line is None or not heredoc.indented:
+            continue
+        body_lines = document.lines[heredoc.opener_line + 1:heredoc.closer_line]
+        formatted = format_kql("\n".join(line.strip() for line in body_lines))
+        if formatted is None:
+            continue
+        new_lines = [base_indent + line if line else line for line in formatted.split("\n")]
+        if new_lines != body_lines:
+            document.replace_lines(heredoc.opener_line + 1, heredoc.closer_line, new_lines)
@@ -0,0 +1,200 @@
+import codecs
+import mmap
+import os
+from contextlib import contextmanager
+from dataclasses import replace
+from pathlib import Path
+
+from .hcl_parser import split_lines
+from .instrumentation import aggregate
+from .output import replace_if_changed, temporary_path
+from .pipeline import STAGES, run_pipeline_batch
+from .range_fmt import line_edits, line_offsets, newline_of
+from .resource_index import index_content
+from .streaming import DEFAULT_STREAM_CHUNK_BYTES, ChunkSplitter
+from .verify import verify_outputs
+
+
+@contextmanager
+def map_file(tf_file: Path):
+    """
+    The content of `tf_file` as a read-only memory map (b"" for an empty file, which cannot be mapped).
+    """
+    with open(tf_file, "rb") as source:
+        if os.fstat(source.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def chunk_spans(data):
+    """
+    Yields (first line, start, end) of every chunk of `data` as streaming.split_chunks cuts it, `end` being
+    the byte offset of the newline after the chunk (or the end of `data`). The bytes are scanned one line at
+    a time; each line is decoded as latin-1, whose character offsets are byte offsets, only to be split.
+    """
+    splitter = ChunkSplitter()
+    chunk_start = 0
+    chunk_line = 0
+    pending = False
+    position = 0
+    line_number = 0
+    while True:
+        newline = data.find(b"\n", position)
+        line_end = newline if newline != -1 else len(data)
+        line = codecs.latin_1_decode(data[position:line_end])[0]
+        if not line.strip() and not splitter.depth and splitter.heredoc_delimiter is None \
+                and not splitter.in_block_comment and pending:
+            # Blank line at the top level: close the chunk before it
+            yield chunk_line, chunk_start, position - 1
+            chunk_start, chunk_line = position, line_number
+        pending = True
+        if splitter.feed(line):
+            yield chunk_line, chunk_start, line_end
+            chunk_start, chunk_line = line_end + 1, line_number + 1
+            pending = False
+        if newline == -1:
+            break
+        position = newline + 1
+        line_number += 1
+    if pending:
+        yield chunk_line, chunk_start, len(data)
+
+
+def chunk_groups(data, max_bytes: int = DEFAULT_STREAM_CHUNK_BYTES):
+    """
+    Packs the non-blank chunks of `data` into groups of roughly `max_bytes` like streaming.group_chunks,
+    as [(first line, start, end, text)]; only the chunks of the group being yielded are decoded.
+    """
+    group = []
+    size = 0
+    for first_line, start, end in chunk_spans(data):
+        text = data[start:end].decode("utf-8")
+        if not text.strip():
+            continue
+        group.append((first_line, start, end, text))
+        size += end - start
+        if size >= max_bytes:
+            yield group
+            group = []
+            size = 0
+    if group:
+        yield group
+
+
+def chunk_edits(data, first_line: int, start: int, end: int, lines: list, formatted: list, newline: str) -> list:
+    """
+    range_fmt.line_edits for the chunk of `data` between `start` and `end`, with file-wide lines and offsets.
+    """
+    view = codecs.latin_1_decode(data[start:end + 1])[0]
+    return [replace(edit, start_line=edit.start_line + first_line, end_line=edit.end_line + first_line,
+                    start_byte=edit.start_byte + start, end_byte=edit.end_byte + start)
+            for edit in line_edits(view, line_offsets(view), 0, lines, formatted, newline)]
+
+
+def mapped_edits(data, stages: list = STAGES, written_stages: list = None,
+                 max_bytes: int = DEFAULT_STREAM_CHUNK_BYTES, profile: bool = False, trace_memory: bool = False,
+                 verify: bool = False, index: bool = False):
+    """
+    Formats UTF-8 source bytes group by group (see chunk_groups) and yields, for every group,
+    (stage name -> Edits, per-stage timings, per-stage StageMetrics, Resources or None without `index`):
+    the Edits (see range_fmt.Edit) that turn the group's chunks of `data` into each stage
+    of `written_stages`, in file order, and the resources of the chunks (see resource_index.index_content).
+    Only the chunks of one group are decoded at a time, and blank chunks are not formatted at all.
+    """
+    written_stages = written_stages if written_stages is not None else [stage for stage in stages if stage.terminal]
+    newline = newline_of(codecs.latin_1_decode(data[:data.find(b"\n") + 1])[0])
+    keep_intermediates = any(not stage.terminal for stage in written_stages)
+    for group in chunk_groups(data, max_bytes):
+        edits = dict((stage.name, []) for stage in written_stages)
+        timings = dict((stage.name, 0.0) for stage in stages)
+        metrics = {}
+        resources = [] if index else None
+        results = run_pipeline_batch([text for *_, text in group], stages, keep_intermediates, profile, trace_memory)
+        for (chunk_line, start, end, text), result in zip(group, results):
+            if verify:
+                verify_outputs(text, result, stages)
+            if index:
+                resources.extend(index_content(text, chunk_line))
+            lines = split_lines(text)
+            for stage in written_stages:
+                edits[stage.name].extend(chunk_edits(data, chunk_line, start, end, lines,
+                                                     split_lines(result.outputs[stage.name]), newline))
+            for stage_name, elapsed in result.timings.items():
+                timings[stage_name] += elapsed
+            if profile:
+                metrics = aggregate({0: metrics, 1: result.metrics})
+        yield edits, timings, metrics, resources
+
+
+class EditWriter:
+    """
+    Writes `data` with edits applied to a temporary file next to `path`, copying the untouched bytes
+    straight from `data`. The edits are written as they come and must arrive in file order.
+    """
+
+    def __init__(self, data, path: Path):
+        self.source = memoryview(data)
+        self.path = path
+        self.temporary = temporary_path(path)
+        self.output = open(self.temporary, "wb")
+        self.position = 0
+
+    def write(self, edits: list):
+        for edit in edits:
+            self.output.write(self.source[self.position:edit.start_byte])
+            self.output.write(edit.text.encode("utf-8"))
+            self.position = edit.end_byte
+
+    def close(self) -> bool:
+        """
+        Writes the rest of `data`; like output.write_if_changed, `path` is only replaced if its content
+        changes. Returns whether it was.
+        """
+        self.output.write(self.source[self.position:])
+        self.output.close()
+        self.source.release()
+        return replace_if_changed(self.temporary, self.path)
+
+    def discard(self):
+        self.output.close()
+        self.source.release()
+        os.unlink(self.temporary)
+
+
+def format_mapped(tf_file: Path, output_folder: Path, stages: list = STAGES, emit_intermediates: bool = False,
+                  max_bytes: int = DEFAULT_STREAM_CHUNK_BYTES, profile: bool = False, trace_memory: bool = False,
+                  verify: bool = False, index: bool = False):
+    """
+    Formats `tf_file` through a memory map and writes every output as the original bytes plus edits, so
+    line endings, the trailing newline and every byte the formatter does not change are kept exactly.
+    The edits of each group are written as soon as it is formatted, so memory use is bounded like in
+    streaming.format_stream; with `verify`, nothing is replaced if a chunk fails.
+    Returns (per-stage timings, per-stage StageMetrics, [(stage, output path, modified)], the Resources of the
+    file or None without `index`).
+    """
+    written_stages = [stage for stage in stages if stage.terminal or emit_intermediates]
+    paths = [output_folder / f"{stage.artifact_prefix}-{tf_file.name}" for stage in written_stages]
+    timings = dict((stage.name, 0.0) for stage in stages)
+    metrics = {}
+    resources = [] if index else None
+    with map_file(tf_file) as data:
+        writers = [EditWriter(data, path) for path in paths]
+        try:
+            for edits, group_timings, group_metrics, group_resources in mapped_edits(
+                    data, stages, written_stages, max_bytes, profile, trace_memory, verify, index):
+                for stage, writer in zip(written_stages, writers):
+                    writer.write(edits[stage.name])
+                for stage_name, elapsed in group_timings.items():
+                    timings[stage_name] += elapsed
+                if profile:
+                    metrics = aggregate({0: metrics, 1: group_metrics})
+                if index:
+                    resources.extend(group_resources)
+        except BaseException:
+            for writer in writers:
+                writer.discard()
+            raise
+        modified = [writer.close() for writer in writers]
+    return timings, metrics, list(zip(written_stages, paths, modified)), resources
@@ -0,0 +1,186 @@
+from typing import Optional
+
+from .hcl_parser import CLOSING, OPENING, TOKEN_PATTERN, Token, tokenize
+
+SPACES_PER_INDENT = 2
+
+# Tokens after which a "-" can only be a negation, never a subtraction
+NEGATION_CONTEXT = {"=", ":", ",", "?", "+", "-", "*", "/", "%", "==", "!=", ">", ">=", "<", "<=", "&&", "||", "!"}
+
+
+class FormatLine:
+    """
+    One physical line split into cells like `hclwrite` does: the leading tokens, the `= value` part of
+    a single-line assignment and a trailing comment. `spaces[i]` is the number of spaces before token i.
+    """
+
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.spaces = [0] + [1 if space_after(tokens[i - 2] if i > 1 else None, tokens[i - 1], tokens[i]) else 0
+                             for i in range(1, len(tokens))]
+        self.indent = 0
+        self.multiline = any("\n" in token.text for token in tokens)
+
+        self.comment_index = None
+        if len(tokens) > 1 and tokens[-1].kind == "comment":
+            self.comment_index = len(tokens) - 1
+
+        # Only assignments whose value is complete on this line take part in `=` alignment
+        self.assign_index = None
+        lead_end = self.comment_index if self.comment_index is not None else len(tokens)
+        for index in range(1, lead_end):
+            if tokens[index].kind == "op" and tokens[index].text == "=":
+                if bracket_change(tokens[index:lead_end]) == 0:
+                    self.assign_index = index
+                break
+
+    def columns(self, end: int) -> int:
+        return self.indent + sum(self.spaces[i] + len(self.tokens[i].text) for i in range(end))
+
+    def render(self, align_closers: bool = False) -> str:
+        if not self.tokens:
+            return ""
+        parts = [" " * self.indent]
+        for space, token in zip(self.spaces, self.tokens):
+            parts.append(" " * space)
+            if token.kind == "comment":
+                parts.append(token.text.rstrip())
+            elif token.kind == "heredoc" and align_closers:
+                parts.append(align_closer(token.text, self.indent))
+            else:
+                parts.append(token.text)
+        return "".join(parts)
+
+
+def align_closer(heredoc: str, indent: int) -> str:
+    """
+    The text of a heredoc token with its closing marker indented by `indent` spaces, the indent of the line
+    the heredoc starts on (unchanged if the heredoc is never closed).
+    """
+    head, separator, closer = heredoc.rpartition("\n")
+    if not separator or closer.strip() != TOKEN_PATTERN.match(heredoc).group("delimiter"):
+        return heredoc
+    return head + separator + " " * indent + closer.lstrip()
+
+
+def bracket_change(tokens: list) -> int:
+    """
+    Net number of brackets opened by `tokens`, ignoring everything from a heredoc onwards.
+    """
+    change = 0
+    for token in tokens:
+        if token.kind in OPENING:
+            change += 1
+        elif token.kind in CLOSING:
+            change -= 1
+        elif token.kind == "heredoc":
+            break
+    return change
+
+
+def space_after(before: Optional[Token], subject: Token, after: Token) -> bool:
+    """
+    Whether `terraform fmt` puts a space between `subject` and `after` (mirrors hclwrite's spaceAfterToken).
+    """
+    if subject.kind == "ident" and after.kind == "lparen":
+        return False
+    if subject.text == "." or after.text == ".":
+        return False
+    if after.text in (",", "..."):
+        return False
+    if subject.text == ",":
+        return True
+    if subject.kind == "heredoc":
+        return False
+    if subject.kind == "ident" and subject.text == "in" and before is not None and before.kind == "ident":
+        return True
+    if after.kind == "lbrack" and (subject.kind in ("ident", "number") or subject.kind in CLOSING):
+        return False
+    if subject.text == "!":
+        return False
+    if subject.text == "-" and subject.kind == "op":
+        return not (before is None or before.kind in OPENING or before.text in NEGATION_CONTEXT)
+    if subject.kind == "lbrace" or after.kind == "rbrace":
+        return not (subject.kind == "lbrace" and after.kind == "rbrace")
+    if subject.kind in OPENING or after.kind in CLOSING:
+        return False
+    return True
+
+
+def split_format_lines(content: str) -> list:
+    lines = []
+    current = []
+    for token in tokenize(content):
+        if token.kind == "newline":
+            lines.append(FormatLine(current))
+            current = []
+        else:
+            current.append(token)
+    lines.append(FormatLine(current))
+    return lines
+
+
+def apply_indentation(lines: list):
+    indents = []
+    for line in lines:
+        if not line.tokens:
+            continue
+        net_brackets = bracket_change([token for token in line.tokens if token.kind != "comment"])
+        if net_brackets > 0:
+            line.indent = SPACES_PER_INDENT * len(indents)
+            indents.append(net_brackets)
+            continue
+        closed = -net_brackets
+        while closed > 0 and indents:
+            if closed >= indents[-1]:
+                closed -= indents.pop()
+            else:
+                indents[-1] -= closed
+                closed = 0
+        line.indent = SPACES_PER_INDENT * len(indents)
+
+
+def align_cells(lines: list, cell: str):
+    """
+    Aligns the `assign` or `comment` cells of consecutive lines that all have one. A line without the cell,
+    or a line whose heredoc/comment runs over several lines, ends the group.
+    """
+    chain = []
+
+    def close_chain():
+        if chain:
+            widest = max(line.columns(getattr(line, cell)) for line in chain)
+            for line in chain:
+                index = getattr(line, cell)
+                line.spaces[index] = widest - line.columns(index) + 1
+            chain.clear()
+
+    for line in lines:
+        if getattr(line, cell) is None:
+            close_chain()
+            continue
+        chain.append(line)
+        if line.multiline:
+            close_chain()
+    close_chain()
+
+
+def format_hcl(content: str, align_closers: bool = False) -> str:
+    """
+    Formats Terraform code following the `terraform fmt` rules, without running the `terraform` binary:
+      - indents 2 spaces per open bracket level
+      - aligns = signs of consecutive single-line assignments and their trailing comments
+      - normalizes the spacing around braces, lists, maps, operators and commas
+      - leaves heredoc bodies, including their closing markers, untouched
+      - removes trailing spaces
+      - ends the file with exactly one line break
+    Canonicalizations that change expressions (e.g. unwrapping "${var.x}") are not performed.
+    With `align_closers`, heredoc closing markers are also indented like the line the heredoc starts on,
+    in the same pass (what terraform_fmt_batch does after `terraform fmt`).
+    """
+    lines = split_format_lines(content)
+    apply_indentation(lines)
+    align_cells(lines, "assign_index")
+    align_cells(lines, "comment_index")
+    formatted = "\n".join(line.render(align_closers) for line in lines).rstrip("\n")
+    return formatted + "\n" if formatted else ""
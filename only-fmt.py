@@ -1,9 +1,9 @@
-import re
 import sys
 from pathlib import Path
 
-# Desired property order
-PROPERTY_ORDER = ["display_name", "description", "name", "severity", "tactics"]
+from hcl_parser import body_statements, find_heredoc_spans, find_resource_spans, replace_spans
+from ordering import header_resource_type, order_properties
+from output import write_if_changed
 
 def format_terraform_file(input_file: str, output_file: str = None):
     path = Path(input_file)
@@ -41,11 +41,7 @@ def format_terraform_file(input_file: str, output_file: str = None):
         # Just add '-' after '<<' and keep body as-is
         return f"{start}-{tag}\n{body}{end}"
 
-    heredoc_pattern = re.compile(
-        r"(^\s*.*<<)([A-Za-z0-9_]+)\n(.*?\n)(\s*\2)", 
-        re.DOTALL | re.MULTILINE
-    )
-    formatted_text = heredoc_pattern.sub(fix_heredoc, formatted_text)
+    formatted_text = replace_spans(formatted_text, find_heredoc_spans(formatted_text, indented=False), fix_heredoc)
 
     # --- Step 3: Reorder properties inside resources ---
     def reorder_block(match):
@@ -53,40 +49,31 @@ def format_terraform_file(input_file: str, output_file: str = None):
         lines = block.splitlines()
 
         header = lines[0]
-        body = lines[1:-1]
         footer = lines[-1]
 
         props = {}
         other_props = []
-        for line in body:
-            stripped = line.strip()
-            if "=" in stripped and not stripped.startswith("#"):
-                key = stripped.split("=")[0].strip()
-                props[key] = line
+        for key, statement in body_statements(block):
+            if key is not None:
+                props[key] = statement
             else:
-                other_props.append(line)
+                other_props.append(statement)
 
-        ordered_lines = []
-        for key in PROPERTY_ORDER:
-            if key in props:
-                ordered_lines.append(props[key])
-
-        for k, v in props.items():
-            if k not in PROPERTY_ORDER:
-                ordered_lines.append(v)
+        ordered_lines = [props[key] for key in order_properties(list(props), header_resource_type(header))]
 
         ordered_lines.extend(other_props)
 
-        return "\n".join([header] + ["  " + l.strip() for l in ordered_lines] + [footer])
+        # Only the first line of a statement is re-indented; heredoc bodies and nested blocks are kept as they are
+        body = [line for statement in ordered_lines for line in ["  " + statement[0].strip()] + statement[1:]]
+        return "\n".join([header] + body + [footer])
 
-    resource_pattern = re.compile(r'resource\s+".+?"\s+".+?"\s*{[^}]*}', re.DOTALL)
-    formatted_text = resource_pattern.sub(reorder_block, formatted_text)
+    formatted_text = replace_spans(formatted_text, find_resource_spans(formatted_text), reorder_block)
 
     # --- Step 4: Save result ---
     if output_file:
-        Path(output_file).write_text(formatted_text)
+        write_if_changed(output_file, formatted_text)
     else:
-        path.write_text(formatted_text)
+        write_if_changed(path, formatted_text)
 
 
 if __name__ == "__main__":
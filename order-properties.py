@@ -1,5 +1,7 @@
 import re
 
+from ordering import header_resource_type, rank_table
+
 def reorder_resource_properties(content: str) -> str:
     """
     Reorders properties in Terraform resource blocks.
@@ -10,9 +12,6 @@ def reorder_resource_properties(content: str) -> str:
     Returns:
         Modified content with properties reordered.
     """
-    # Define the preferred order
-    preferred_order = ["display_name", "description", "name", "severity", "tactics", "query"]
-
     lines = content.splitlines()
     output = []
     inside_resource = False
@@ -35,6 +34,9 @@ def reorder_resource_properties(content: str) -> str:
             
             # End of resource block
             if brace_count == 0:
+                # The configured order of the resource type (see ordering.PROPERTY_ORDERS)
+                ranks = rank_table(header_resource_type(resource_lines[0])) or {}
+
                 # Reorder properties inside the block
                 reordered_lines = []
                 other_lines = []
@@ -58,8 +60,8 @@ def reorder_resource_properties(content: str) -> str:
                                     break
                                 i += 1
                         # Save in order dict
-                        if prop_name in preferred_order:
-                            reordered_lines.append((preferred_order.index(prop_name), block_lines))
+                        if prop_name in ranks:
+                            reordered_lines.append((ranks[prop_name], block_lines))
                         else:
                             other_lines.append(block_lines)
                     else:
@@ -0,0 +1,73 @@
+import re
+from typing import Optional
+
+# Property order per block. Keys are a resource type, optionally followed by the types of the nested blocks
+# leading to the block (`azurerm_sentinel_alert_rule_scheduled.incident_configuration`); `*` stands for any
+# resource type. Properties that are not listed keep their relative order after the listed ones.
+PROPERTY_ORDERS = {
+    "*": ["suppression_duration", "query", "display_name", "description", "name", "severity", "tactics"],
+    # The order of the Sentinel GUI
+    "azurerm_sentinel_alert_rule_scheduled": [
+        "for_each", "name", "display_name", "description", "log_analytics_workspace_id", "severity", "tactics",
+        "query_frequency", "query_period", "query", "enabled", "suppression_duration", "suppression_enabled",
+        "trigger_operator", "trigger_threshold",
+    ],
+    "azurerm_sentinel_alert_rule_scheduled.incident_configuration": ["create_incident"],
+    "azurerm_sentinel_alert_rule_scheduled.incident_configuration.grouping": [
+        "enabled", "lookback_duration", "reopen_closed_incidents", "entity_matching_method", "group_by_entities",
+        "group_by_alert_details", "group_by_custom_details",
+    ],
+    "azurerm_sentinel_alert_rule_scheduled.event_grouping": ["aggregation_method"],
+    "azurerm_sentinel_alert_rule_scheduled.entity_mapping": ["entity_type"],
+    "azurerm_sentinel_alert_rule_scheduled.entity_mapping.field_mapping": ["identifier", "column_name"],
+    "azurerm_sentinel_alert_rule_scheduled.alert_details_override": [
+        "display_name_format", "description_format", "severity_column_name", "tactics_column_name",
+    ],
+}
+
+HEADER_PATTERN = re.compile(r'\s*resource\s+"([^"]+)"')
+
+
+def compile_orders(orders: dict) -> dict:
+    """
+    {key: [property, ...]} -> {key: {property: rank}}, so a rank is one dict lookup.
+    """
+    return dict((key, dict((name, rank) for rank, name in enumerate(names))) for key, names in orders.items())
+
+
+RANK_TABLES = compile_orders(PROPERTY_ORDERS)
+
+
+def rank_table(resource_type: str, block_path: tuple = (), tables: dict = RANK_TABLES) -> Optional[dict]:
+    """
+    The ranks for a block of `resource_type` reached through the nested `block_path` (() for the resource
+    body itself): the entry of the resource type if there is one, otherwise the `*` entry. None if neither.
+    """
+    nested = "".join("." + block_type for block_type in block_path)
+    table = tables.get(resource_type + nested)
+    return table if table is not None else tables.get("*" + nested)
+
+
+def sort_key(table: dict, name: Optional[str]) -> int:
+    """
+    Rank of a property (None for anything that is not one) for a stable sort: unlisted ones come last.
+    """
+    return table.get(name, len(table)) if name is not None else len(table)
+
+
+def order_properties(names: list, resource_type: str, block_path: tuple = ()) -> list:
+    """
+    `names` in the configured order of their block; unchanged if no order is configured for it.
+    """
+    table = rank_table(resource_type, block_path)
+    if table is None:
+        return list(names)
+    return sorted(names, key=lambda name: sort_key(table, name))
+
+
+def header_resource_type(header: str) -> str:
+    """
+    The resource type of a `resource "type" "name" {` line ("" for any other line).
+    """
+    match = HEADER_PATTERN.match(header)
+    return match.group(1) if match else ""
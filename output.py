@@ -0,0 +1,74 @@
+import filecmp
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+# Permissions of newly created files; umask can only be read by setting it, so it is read once at import
+# rather than around every write, where another thread could create a file in between
+UMASK = os.umask(0)
+os.umask(UMASK)
+NEW_FILE_MODE = 0o666 & ~UMASK
+
+
+def temporary_path(path: Path) -> Path:
+    """
+    A new empty temporary file next to `path`, so it can later be renamed over it atomically. It gets the
+    mode of `path` if that exists, otherwise the mode a new file would get (mkstemp's own is 0600).
+    """
+    path = Path(path)
+    fd, name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        try:
+            mode = path.stat().st_mode & 0o7777
+        except FileNotFoundError:
+            mode = NEW_FILE_MODE
+        os.fchmod(fd, mode)
+    except BaseException:
+        os.close(fd)
+        os.unlink(name)
+        raise
+    os.close(fd)
+    return Path(name)
+
+
+def replace_if_changed(temporary: Path, path: Path) -> bool:
+    """
+    Renames `temporary` over `path` unless `path` already has the same content, in which case `temporary`
+    is removed and `path` is left alone (mtime included). Returns whether `path` was modified.
+    """
+    path = Path(path)
+    try:
+        if path.is_file() and filecmp.cmp(temporary, path, shallow=False):
+            os.unlink(temporary)
+            return False
+        if path.exists():
+            shutil.copymode(path, temporary)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+        raise
+    return True
+
+
+def write_if_changed(path: Path, content: str, encoding: str = "utf-8") -> bool:
+    """
+    Writes `content` to `path` only if it differs from what is already there. Changed files are written to
+    a temporary file first and renamed over the target, so readers never see a partial file.
+    Returns whether `path` was modified.
+    """
+    path = Path(path)
+    data = content.encode(encoding)
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    temporary = temporary_path(path)
+    try:
+        temporary.write_bytes(data)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return replace_if_changed(temporary, path)
@@ -1,6 +1,8 @@
 import re
 from pathlib import Path
 
+from output import write_if_changed
+
 def add_dash_to_heredocs(text: str) -> str:
     # Replace <<WORD with <<-WORD (only at assignment points)
     return re.sub(r'(<<)([A-Z]+)', r'\1-\2', text)
@@ -40,8 +42,9 @@ def format_tf_file(filepath: str):
     formatted_blocks = [format_block(block) for block in blocks]
     formatted_content = '\n'.join(formatted_blocks)
 
-    with open(filepath, 'w') as f:
-        f.write(formatted_content)
+    if not write_if_changed(filepath, formatted_content):
+        print("✅ Already formatted, nothing to update.")
+        return
 
     print("✅ Updated heredocs and formatted key-value pairs.")
 
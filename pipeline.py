@@ -0,0 +1,214 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Callable, Optional
+
+from .document import Document, as_document, as_text
+from .output import write_if_changed
+from .instrumentation import StageProbe
+from .terraform_fmt import DEFAULT_BACKEND, terraform_fmt, terraform_fmt_batch
+from .heredoc_fmt import (convert_to_indented_heredoc, align_heredoc_closing_delimited,
+                          convert_to_indented_heredoc_document, align_heredoc_closing_delimited_document)
+from .kql_fmt import format_kql_queries, format_kql_queries_document
+from .custom_fmt import (reorder_resource_properties, align_key_value_pairs,
+                         reorder_resource_properties_document, align_key_value_pairs_document)
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    A single formatting step. `source` names the stage whose output feeds this one
+    (None means the original file content); together the sources form the pipeline DAG.
+    Stages with a `document_func` edit the shared, parse-once Document in place instead of
+    producing new text. Stages with a `batch` function are run once for a whole group of files
+    instead of once per file. `external` stages spend their time waiting on another process,
+    so independent stages are run alongside them.
+    """
+    name: str
+    func: Callable[[str], str]
+    source: Optional[str]
+    artifact_prefix: str
+    description: str
+    terminal: bool = False
+    batch: Optional[Callable[[list], list]] = None
+    document_func: Optional[Callable[[Document], None]] = None
+    external: bool = False
+
+
+def build_stages(fmt_backend: str = DEFAULT_BACKEND) -> list:
+    """
+    The formatting stages, with the `terraform fmt` stage running on `fmt_backend`.
+    """
+    return [
+        Stage("reorder_resource_properties", reorder_resource_properties, None,
+              "reorder_resource_properties", "Reordered the resource properties",
+              document_func=reorder_resource_properties_document),
+        Stage("convert_to_indented_heredoc", convert_to_indented_heredoc, "reorder_resource_properties",
+              "indented-heredoc", "Converted to indented heredoc",
+              document_func=convert_to_indented_heredoc_document),
+        Stage("format_kql_queries", format_kql_queries, "convert_to_indented_heredoc",
+              "formatted-kql", "Formatted the KQL queries",
+              document_func=format_kql_queries_document),
+        Stage("align_heredoc_closing_delimited", align_heredoc_closing_delimited, "format_kql_queries",
+              "aligned-heredoc", "Modified to align heredoc closing delimited",
+              document_func=align_heredoc_closing_delimited_document),
+        Stage("terraform_fmt", partial(terraform_fmt, backend=fmt_backend), "align_heredoc_closing_delimited",
+              "formatted-official", f"Formatted file by `terraform fmt` ({fmt_backend})", terminal=True,
+              batch=partial(terraform_fmt_batch, backend=fmt_backend), external=fmt_backend == "terraform"),
+        Stage("align_key_value_pairs", align_key_value_pairs, "align_heredoc_closing_delimited",
+              "formatted-custom", "Formatted file by aligning = in key-value pairs", terminal=True,
+              document_func=align_key_value_pairs_document),
+    ]
+
+
+STAGES = build_stages()
+
+
+@dataclass
+class PipelineResult:
+    """
+    In-memory outputs of every stage for one file, keyed by stage name, plus per-stage wall time in seconds
+    and, when profiling, the full StageMetrics of every stage.
+    """
+    outputs: dict = field(default_factory=dict)
+    timings: dict = field(default_factory=dict)
+    metrics: dict = field(default_factory=dict)
+
+
+def run_pipeline(content: str, stages: list = STAGES, keep_intermediates: bool = False,
+                 profile: bool = False, trace_memory: bool = False) -> PipelineResult:
+    """
+    Runs every stage on `content`, handing each stage the in-memory output of its source stage.
+    Nothing is read from or written to disk.
+    """
+    return run_pipeline_batch([content], stages, keep_intermediates, profile, trace_memory)[0]
+
+
+def stage_waves(stages: list) -> list:
+    """
+    Groups the stages into waves: every stage runs in the first wave after the one producing its source,
+    so the stages of one wave are independent of each other.
+    """
+    produced = {None}
+    pending = list(stages)
+    waves = []
+    while pending:
+        wave = [stage for stage in pending if stage.source in produced]
+        if not wave:
+            raise ValueError(f"stages with unknown sources: {', '.join(stage.name for stage in pending)}")
+        waves.append(wave)
+        produced.update(stage.name for stage in wave)
+        pending = [stage for stage in pending if stage not in wave]
+    return waves
+
+
+def run_pipeline_batch(contents: list, stages: list = STAGES, keep_intermediates: bool = False,
+                       profile: bool = False, trace_memory: bool = False) -> list:
+    """
+    Runs the stage DAG over a group of files, one wave of independent stages at a time (see stage_waves).
+    When a wave holds an `external` stage, its stages run on separate threads, so e.g. the key-value
+    alignment proceeds while `terraform fmt` runs and a file takes as long as the slower branch.
+    Stages with a `batch` function get all pending inputs in a single call; their wall time is split
+    evenly across the files. Each file is parsed into a Document once, by the first document stage,
+    and that Document is handed on from stage to stage (copied only where two stages branch off
+    the same source). Only terminal outputs are rendered to text unless `keep_intermediates` is set.
+    With `profile` every stage run is recorded in PipelineResult.metrics (see instrumentation.StageProbe).
+    Returns one PipelineResult per input, in order.
+    """
+    results = [PipelineResult() for _ in contents]
+    values = [{None: content} for content in contents]
+    consumers = {}
+    for stage in stages:
+        consumers[stage.source] = consumers.get(stage.source, 0) + 1
+
+    for wave in stage_waves(stages):
+        readers = {}
+        for stage in wave:
+            consumers[stage.source] -= 1
+            if stage.batch is None:
+                readers[stage.source] = readers.get(stage.source, 0) + 1
+
+        # Batch inputs are rendered before the wave starts, so a document stage running alongside
+        # may edit the source in place; document stages sharing a source each work on a copy
+        tasks = []
+        for stage in wave:
+            if stage.batch is not None:
+                stage_inputs = [as_text(value[stage.source]) for value in values]
+                tasks.append(partial(run_batch_stage, stage, stage_inputs, profile, trace_memory))
+            else:
+                shared = consumers[stage.source] > 0 or readers[stage.source] > 1
+                tasks.append(partial(run_file_stage, stage, [value[stage.source] for value in values],
+                                     shared, profile, trace_memory))
+
+        if len(tasks) > 1 and any(stage.external for stage in wave):
+            with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+                wave_runs = list(executor.map(lambda task: task(), tasks))
+        else:
+            wave_runs = [task() for task in tasks]
+
+        for stage, runs in zip(wave, wave_runs):
+            for value, result, (stage_output, elapsed, metrics) in zip(values, results, runs):
+                value[stage.name] = stage_output
+                result.timings[stage.name] = elapsed
+                if profile:
+                    result.metrics[stage.name] = metrics
+                if stage.terminal or keep_intermediates:
+                    result.outputs[stage.name] = as_text(stage_output)
+        for stage in wave:
+            if not consumers[stage.source]:
+                for value in values:
+                    value.pop(stage.source, None)
+    return results
+
+
+def run_batch_stage(stage: Stage, stage_inputs: list, profile: bool, trace_memory: bool) -> list:
+    """
+    Runs a batch stage over every file at once; returns (output, seconds, metrics) per file.
+    """
+    with StageProbe(profile, trace_memory) as probe:
+        stage_outputs = stage.batch(stage_inputs)
+    share = max(len(stage_inputs), 1)
+    return [(stage_output, probe.wall_seconds / share,
+             probe.metrics(stage_input, stage_output, share) if profile else None)
+            for stage_input, stage_output in zip(stage_inputs, stage_outputs)]
+
+
+def run_file_stage(stage: Stage, stage_inputs: list, shared: bool, profile: bool, trace_memory: bool) -> list:
+    """
+    Runs a stage file by file; returns (output, seconds, metrics) per file.
+    """
+    runs = []
+    for stage_input in stage_inputs:
+        with StageProbe(profile, trace_memory, stage_input) as probe:
+            stage_output = run_stage(stage, stage_input, shared)
+        runs.append((stage_output, probe.wall_seconds,
+                     probe.metrics(stage_input, stage_output) if profile else None))
+    return runs
+
+
+def run_stage(stage: Stage, stage_input, shared: bool):
+    if stage.document_func is None:
+        return stage.func(as_text(stage_input))
+    document = as_document(stage_input)
+    if shared and document is stage_input:
+        document = document.copy()
+    stage.document_func(document)
+    return document
+
+
+def write_outputs(result: PipelineResult, output_folder: Path, file_name: str,
+                  stages: list = STAGES, emit_intermediates: bool = False) -> list:
+    """
+    Writes the terminal stage outputs (and, for debugging, the intermediate ones) to `output_folder`.
+    Files that already hold the same content are not rewritten (see output.write_if_changed).
+    Returns (stage, path, modified) for every output file.
+    """
+    written = []
+    for stage in stages:
+        if not (stage.terminal or emit_intermediates):
+            continue
+        output_file = output_folder / f"{stage.artifact_prefix}-{file_name}"
+        modified = write_if_changed(output_file, result.outputs[stage.name])
+        written.append((stage, output_file, modified))
+    return written
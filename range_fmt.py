@@ -0,0 +1,182 @@
+import codecs
+import difflib
+from dataclasses import dataclass
+from typing import Optional
+
+from .check import DEFAULT_CHECK_TARGET, stage_path
+from .hcl_parser import Attribute, Block, parse, split_lines
+from .pipeline import STAGES, run_pipeline_batch
+
+
+@dataclass
+class Edit:
+    """
+    Replaces lines [start_line, end_line) of the original text (0-based), i.e. its UTF-8 encoded bytes
+    [start_byte, end_byte), with `text`. An insertion has start_line == end_line.
+    """
+    start_line: int
+    end_line: int
+    start_byte: int
+    end_byte: int
+    text: str
+
+
+def enclosing_items(items: list, start_line: int, end_line: int) -> list:
+    """
+    The top-level blocks and attributes overlapping lines [start_line, end_line). Top-level attributes are
+    aligned together by `terraform fmt`, so a selected attribute brings the adjacent attributes along.
+    """
+    selected = []
+    for index, item in enumerate(items):
+        if item.start_line < max(end_line, start_line + 1) and item.end_line >= start_line:
+            selected.append(index)
+    for index in list(selected):
+        if not isinstance(items[index], Attribute):
+            continue
+        first = last = index
+        while first > 0 and isinstance(items[first - 1], Attribute) \
+                and items[first - 1].end_line + 1 == items[first].start_line:
+            first -= 1
+        while last + 1 < len(items) and isinstance(items[last + 1], Attribute) \
+                and items[last].end_line + 1 == items[last + 1].start_line:
+            last += 1
+        selected.extend(range(first, last + 1))
+    return [items[index] for index in sorted(set(selected))]
+
+
+def group_items(items: list) -> list:
+    """
+    Merges runs of adjacent items into (first line, last line + 1) spans that are formatted as one chunk.
+    """
+    spans = []
+    for item in items:
+        if spans and spans[-1][1] == item.start_line:
+            spans[-1] = (spans[-1][0], item.end_line + 1)
+        else:
+            spans.append((item.start_line, item.end_line + 1))
+    return spans
+
+
+def line_offsets(content: str) -> list:
+    """
+    Offset of the first character of every line in `content`, plus len(content). For byte offsets, pass
+    the bytes decoded as latin-1 (see byte_view).
+    """
+    offsets = [0]
+    position = content.find("\n")
+    while position != -1:
+        offsets.append(position + 1)
+        position = content.find("\n", position + 1)
+    if offsets[-1] != len(content):
+        offsets.append(len(content))
+    return offsets
+
+
+def byte_view(content: str) -> str:
+    """
+    `content` encoded as UTF-8 and decoded as latin-1: the same lines, with one character per byte.
+    """
+    return codecs.latin_1_decode(content.encode("utf-8"))[0]
+
+
+def newline_of(content: str) -> str:
+    """
+    The line break used by `content`, judging by its first line.
+    """
+    first = content.find("\n")
+    return "\r\n" if first > 0 and content[first - 1] == "\r" else "\n"
+
+
+def make_edit(content: str, offsets: list, start_line: int, end_line: int, new_lines: list, newline: str) -> Edit:
+    text = "".join(line + newline for line in new_lines)
+    if new_lines and end_line == len(offsets) - 1 and not content.endswith("\n"):
+        # The last line has no line break of its own
+        text = newline + text[:-len(newline)] if start_line == end_line else text[:-len(newline)]
+    return Edit(start_line, end_line, offsets[start_line], offsets[end_line], text)
+
+
+def line_edits(content: str, offsets: list, first_line: int, lines: list, formatted: list, newline: str) -> list:
+    """
+    Edits turning `lines`, which start at line `first_line` of `content`, into `formatted`; one per changed run.
+    """
+    edits = []
+    matcher = difflib.SequenceMatcher(None, lines, formatted, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            edits.append(make_edit(content, offsets, first_line + i1, first_line + i2, formatted[j1:j2], newline))
+    return edits
+
+
+def format_items(content: str, items: list, stages: list = STAGES, target: str = DEFAULT_CHECK_TARGET) -> list:
+    """
+    Formats only the lines of `items` (top-level blocks / attributes of `content`), up to the output of the
+    `target` stage, and returns the Edits turning `content` into the result, one per changed run of lines.
+    """
+    lines = split_lines(content)
+    spans = group_items(items)
+    path = stage_path(stages, target)
+    results = run_pipeline_batch(["\n".join(lines[start:end]) for start, end in spans], path,
+                                 keep_intermediates=not path[-1].terminal)
+
+    offsets = line_offsets(byte_view(content))
+    newline = newline_of(content)
+    edits = []
+    for (start, end), result in zip(spans, results):
+        edits.extend(line_edits(content, offsets, start, lines[start:end], split_lines(result.outputs[target]),
+                                newline))
+    return edits
+
+
+def format_line_range(content: str, start_line: int, end_line: int, stages: list = STAGES,
+                      target: str = DEFAULT_CHECK_TARGET) -> list:
+    """
+    Formats the top-level blocks enclosing lines [start_line, end_line) (0-based); returns a list of Edits.
+    """
+    return format_items(content, enclosing_items(parse(content), start_line, end_line), stages, target)
+
+
+def format_byte_range(content: str, start: int, end: int, stages: list = STAGES,
+                      target: str = DEFAULT_CHECK_TARGET) -> list:
+    """
+    Formats the top-level blocks enclosing the UTF-8 bytes [start, end) of `content`; returns a list of Edits.
+    """
+    data = content.encode("utf-8")
+    start_line = data.count(b"\n", 0, start)
+    end_line = data.count(b"\n", 0, max(end - 1, start)) + 1
+    return format_line_range(content, start_line, end_line, stages, target)
+
+
+def format_address(content: str, address: str, stages: list = STAGES, target: str = DEFAULT_CHECK_TARGET) -> list:
+    """
+    Formats the block with the given address (e.g. `tfe_policy.example_sentinel_policy`, see Block.address);
+    returns a list of Edits. Raises ValueError when there is no such block.
+    """
+    items = [item for item in parse(content) if isinstance(item, Block) and item.address == address]
+    if not items:
+        raise ValueError(f"no block with address {address}")
+    return format_items(content, items, stages, target)
+
+
+def apply_edits(content: str, edits: list) -> str:
+    """
+    Applies non-overlapping Edits made against `content`.
+    """
+    data = content.encode("utf-8")
+    for edit in sorted(edits, key=lambda edit: edit.start_byte, reverse=True):
+        data = data[:edit.start_byte] + edit.text.encode("utf-8") + data[edit.end_byte:]
+    return data.decode("utf-8")
+
+
+def format_selection(content: str, lines: Optional[tuple] = None, byte_range: Optional[tuple] = None,
+                     address: Optional[str] = None, stages: list = STAGES,
+                     target: str = DEFAULT_CHECK_TARGET) -> list:
+    """
+    Dispatches to format_line_range, format_byte_range or format_address, whichever selection is given.
+    """
+    if address is not None:
+        return format_address(content, address, stages, target)
+    if byte_range is not None:
+        return format_byte_range(content, byte_range[0], byte_range[1], stages, target)
+    if lines is not None:
+        return format_line_range(content, lines[0], lines[1], stages, target)
+    raise ValueError("no line range, byte range or address given")
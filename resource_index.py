@@ -0,0 +1,154 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from .hcl_parser import Block, parse
+from .incremental import file_signature
+from .output import write_if_changed
+
+DEFAULT_INDEX = ".tf-index.json"
+
+# Bump whenever the meaning of an index entry changes; an index of another version is rebuilt
+INDEX_VERSION = 1
+
+
+class Resource(NamedTuple):
+    """
+    One resource block of the index: its address, 1-based line, `display_name` and `name` values (None
+    if not set) and the hash of its `query` (see query_hash).
+    """
+    address: str
+    line: int
+    display_name: Optional[str]
+    name: Optional[str]
+    query: Optional[str]
+
+
+# Fields a resource can be looked up (and checked for duplicates) by
+INDEX_KEYS = ("address", "display_name", "name", "query")
+
+
+def attribute_value(content: str, attribute) -> str:
+    """
+    The value of an attribute: a string without its quotes, a heredoc without its markers, anything
+    else as written.
+    """
+    value = content[attribute.start:attribute.end].split("=", 1)[1].strip()
+    if value.startswith("<<"):
+        return "\n".join(value.split("\n")[1:-1])
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def query_hash(query: str) -> str:
+    """
+    Hash of a query with all whitespace collapsed, so the same query formatted differently hashes the same.
+    """
+    return hashlib.sha256(" ".join(query.split()).encode("utf-8")).hexdigest()[:16]
+
+
+def index_content(content: str, first_line: int = 0) -> list:
+    """
+    The Resources of the top-level resource blocks in `content`, which starts at line `first_line`
+    (0-based) of its file.
+    """
+    resources = []
+    for item in parse(content):
+        if not isinstance(item, Block) or item.type != "resource":
+            continue
+        values = dict((attribute.name, attribute_value(content, attribute)) for attribute in item.attributes()
+                      if attribute.name in ("display_name", "name", "query"))
+        query = values.get("query")
+        resources.append(Resource(item.address, first_line + item.start_line + 1, values.get("display_name"),
+                                  values.get("name"), query_hash(query) if query is not None else None))
+    return resources
+
+
+def index_file(tf_file: Path) -> list:
+    return index_content(tf_file.read_text(encoding="utf-8"))
+
+
+class ResourceIndex:
+    """
+    Resources of many files, stored as {path: {"signature": [mtime_ns, size], "resources": [...]}} so that
+    only files changed since they were indexed have to be parsed again.
+    """
+
+    def __init__(self, files: Optional[dict] = None):
+        self.files = files if files is not None else {}
+
+    @classmethod
+    def load(cls, index_file: Path) -> "ResourceIndex":
+        """
+        Reads the index saved by a previous run; empty if it is missing, unreadable or of another version.
+        """
+        try:
+            stored = json.loads(Path(index_file).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return cls()
+        if stored.get("version") != INDEX_VERSION:
+            return cls()
+        index = cls()
+        index.merge(stored["files"])
+        return index
+
+    def merge(self, files: dict):
+        """
+        Adds entries in the stored form ({path: {"signature": ..., "resources": [[...], ...]}}, e.g. from a
+        shard bundle), replacing those of the same paths.
+        """
+        for path, entry in files.items():
+            self.files[path] = {"signature": entry["signature"],
+                                "resources": [Resource(*resource) for resource in entry["resources"]]}
+
+    def save(self, index_file: Path) -> bool:
+        files = dict((path, self.files[path]) for path in sorted(self.files))
+        return write_if_changed(Path(index_file), json.dumps({"version": INDEX_VERSION, "files": files},
+                                                             separators=(",", ":")))
+
+    def update(self, tf_file: Path, resources: list):
+        self.files[str(tf_file)] = {"signature": file_signature(tf_file), "resources": list(resources)}
+
+    def refresh(self, tf_files: list) -> int:
+        """
+        Indexes the files of `tf_files` that are new or changed since they were indexed and forgets the
+        files that no longer exist. Returns the number of files parsed.
+        """
+        parsed = 0
+        for tf_file in tf_files:
+            entry = self.files.get(str(tf_file))
+            if entry is None or entry["signature"] != file_signature(tf_file):
+                self.update(tf_file, index_file(tf_file))
+                parsed += 1
+        for path in [path for path in self.files if not Path(path).is_file()]:
+            del self.files[path]
+        return parsed
+
+    def resources(self) -> list:
+        """
+        Every (path, Resource) of the index, by path and line.
+        """
+        return [(path, resource) for path in sorted(self.files) for resource in self.files[path]["resources"]]
+
+    def find(self, key: str, value: str) -> list:
+        """
+        The (path, Resource) pairs whose `key` (one of INDEX_KEYS) equals `value`.
+        """
+        return [(path, resource) for path, resource in self.resources() if getattr(resource, key) == value]
+
+    def duplicates(self) -> list:
+        """
+        (key, value, [(path, Resource)]) for every value of an INDEX_KEYS field shared by several resources:
+        an address defined twice, or the same display name, name or query under different addresses.
+        """
+        found = []
+        for key in INDEX_KEYS:
+            groups = {}
+            for path, resource in self.resources():
+                value = getattr(resource, key)
+                if value is not None:
+                    groups.setdefault(value, []).append((path, resource))
+            found.extend((key, value, group) for value, group in sorted(groups.items()) if len(group) > 1)
+        return found
@@ -0,0 +1,309 @@
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from .block_memo import BlockMemo, run_pipeline_memoized
+from .cache import ResultCache
+from .check import DEFAULT_CHECK_TARGET, block_diff, check_batch
+from .hcl_parser import split_lines
+from .mapped import format_mapped
+from .pipeline import STAGES, PipelineResult, run_pipeline, run_pipeline_batch, write_outputs
+from .resource_index import index_content
+from .streaming import DEFAULT_STREAM_CHUNK_BYTES, format_stream
+from .verify import verify_outputs
+
+
+@dataclass
+class RunOptions:
+    """
+    Settings shared by every worker of one run. Must stay picklable for the process pool.
+    Outputs of files found below one of the `input_roots` go to the matching sub-folder of `output_folder`.
+    With `verify`, outputs are only written (and cached) once verify.verify_outputs accepted them.
+    With `index`, every report carries the resources of its file (see resource_index).
+    """
+    output_folder: Path
+    stages: list = field(default_factory=lambda: STAGES)
+    emit_intermediates: bool = False
+    cache: Optional[ResultCache] = None
+    profile: bool = False
+    trace_memory: bool = False
+    stream_chunk_bytes: int = DEFAULT_STREAM_CHUNK_BYTES
+    block_memo: bool = False
+    check: bool = False
+    diff: bool = False
+    check_target: str = DEFAULT_CHECK_TARGET
+    input_roots: tuple = ()
+    verify: bool = True
+    index: bool = False
+
+
+@dataclass
+class FileReport:
+    """
+    Outcome of formatting one file: the log lines to print, per-stage timings and the error, if any.
+    `metrics` holds the per-stage StageMetrics when profiling; `block_hits` / `block_misses` count the
+    blocks reused from / added to the block memo. `outputs` / `modified` count the output files produced
+    and those whose content actually changed on disk. In check mode `unformatted` is set for files that
+    formatting would change. `resources` lists the resource_index.Resources of the file when indexing.
+    """
+    name: str
+    log: list = field(default_factory=list)
+    timings: dict = field(default_factory=dict)
+    error: Optional[str] = None
+    cached: bool = False
+    metrics: dict = field(default_factory=dict)
+    block_hits: int = 0
+    block_misses: int = 0
+    outputs: int = 0
+    modified: int = 0
+    unformatted: bool = False
+    resources: Optional[list] = None
+
+
+def describe_error(error: Exception) -> str:
+    if isinstance(error, subprocess.CalledProcessError):
+        stderr = (error.stderr or b"").decode("utf-8", errors="replace").strip()
+        return f"`{' '.join(error.cmd)}` exited with {error.returncode}" + (f": {stderr}" if stderr else "")
+    return f"{type(error).__name__}: {error}"
+
+
+def describe_targets(report: FileReport, written: list) -> dict:
+    """
+    Counts the written outputs into `report`; returns the " -> path" suffix of each stage's log line.
+    """
+    targets = {}
+    for stage, path, modified in written:
+        report.outputs += 1
+        report.modified += modified
+        targets[stage.name] = f" -> {path}" + ("" if modified else " (unchanged)")
+    return targets
+
+
+def display_name(tf_file: Path, options: RunOptions) -> str:
+    """
+    How reports name `tf_file`: its path below the input root it was found in, otherwise its file name.
+    """
+    for root in options.input_roots:
+        try:
+            return tf_file.relative_to(root).as_posix()
+        except ValueError:
+            continue
+    return tf_file.name
+
+
+def output_folder_for(tf_file: Path, options: RunOptions) -> Path:
+    for root in options.input_roots:
+        try:
+            relative = tf_file.parent.relative_to(root)
+        except ValueError:
+            continue
+        folder = options.output_folder / relative
+        folder.mkdir(parents=True, exist_ok=True)
+        return folder
+    return options.output_folder
+
+
+def report_file(tf_file: Path, result, options: RunOptions, cached: bool = False) -> FileReport:
+    name = display_name(tf_file, options)
+    report = FileReport(name, log=[f"Formatting: {name}"], timings=dict(result.timings),
+                        cached=cached, metrics=dict(result.metrics))
+    targets = describe_targets(report, write_outputs(result, output_folder_for(tf_file, options), tf_file.name,
+                                                     options.stages, emit_intermediates=options.emit_intermediates))
+    if cached:
+        report.log.extend(f"✔ Reused cached result{target}" for target in targets.values())
+        return report
+    for stage in options.stages:
+        elapsed_ms = result.timings[stage.name] * 1000
+        report.log.append(f"✔ {stage.description}{targets.get(stage.name, '')} ({elapsed_ms:.2f} ms)")
+    return report
+
+
+def format_batch(tf_files: list, options: RunOptions, memo: Optional[BlockMemo] = None) -> list:
+    """
+    Formats a group of files in memory and writes their outputs. Runs in a worker process when `--jobs` > 1.
+    Files found in the cache skip the pipeline entirely; the rest are formatted together and stored in it.
+    With `block_memo`, repeated blocks across the batch are formatted only once (see block_memo); passing
+    a `memo` also reuses the blocks of earlier batches.
+    If the batch fails as a whole (e.g. `terraform fmt` rejects one file), every file is retried on its own
+    so that one bad file only fails itself. Returns one FileReport per file, in input order.
+    """
+    # Intermediate artifacts are never cached, so the cache is bypassed when they are requested
+    cache = options.cache if not options.emit_intermediates else None
+
+    reports = {}
+    contents = {}
+    pending = []
+    for tf_file in tf_files:
+        try:
+            content = tf_file.read_text(encoding="utf-8")
+        except Exception as error:
+            reports[tf_file] = failed_report(tf_file, error, options)
+            continue
+        contents[tf_file] = content
+        outputs = cache.get(content) if cache is not None else None
+        if outputs is not None:
+            reports[tf_file] = safe_report(tf_file, PipelineResult(outputs=outputs), options, cached=True)
+        else:
+            pending.append((tf_file, content))
+
+    memo_stats = None
+    try:
+        pending_contents = [content for _, content in pending]
+        if options.block_memo:
+            memo = memo if memo is not None else BlockMemo()
+            results, memo_stats = run_pipeline_memoized(pending_contents, memo, options.stages,
+                                                        options.emit_intermediates, options.profile,
+                                                        options.trace_memory)
+        else:
+            results = run_pipeline_batch(pending_contents, options.stages, options.emit_intermediates,
+                                         options.profile, options.trace_memory)
+    except Exception:
+        results = None
+
+    for index, (tf_file, content) in enumerate(pending):
+        if results is None:
+            reports[tf_file] = format_single(tf_file, options, content)
+            continue
+        try:
+            if options.verify:
+                verify_outputs(content, results[index], options.stages)
+        except Exception as error:
+            reports[tf_file] = failed_report(tf_file, error, options)
+            continue
+        if cache is not None:
+            cache.put(content, results[index].outputs)
+        reports[tf_file] = safe_report(tf_file, results[index], options)
+        if memo_stats is not None:
+            reports[tf_file].block_hits = memo_stats[index].hits
+            reports[tf_file].block_misses = memo_stats[index].misses
+    if options.index:
+        # The content is still in memory, so indexing costs one parse instead of a separate pass over the files
+        for tf_file, content in contents.items():
+            reports[tf_file].resources = index_content(content)
+    return [reports[tf_file] for tf_file in tf_files]
+
+
+def format_single(tf_file: Path, options: RunOptions, content: Optional[str] = None) -> FileReport:
+    cache = options.cache if not options.emit_intermediates else None
+    try:
+        if content is None:
+            content = tf_file.read_text(encoding="utf-8")
+        result = run_pipeline(content, options.stages, options.emit_intermediates,
+                              options.profile, options.trace_memory)
+        if options.verify:
+            verify_outputs(content, result, options.stages)
+        if cache is not None:
+            cache.put(content, result.outputs)
+        return report_file(tf_file, result, options)
+    except Exception as error:
+        return failed_report(tf_file, error, options)
+
+
+def safe_report(tf_file: Path, result, options: RunOptions, cached: bool = False) -> FileReport:
+    try:
+        return report_file(tf_file, result, options, cached)
+    except Exception as error:
+        return failed_report(tf_file, error, options)
+
+
+def format_streamed(tf_files: list, options: RunOptions) -> list:
+    """
+    Like format_batch, but reads and writes every file incrementally (see streaming.format_stream)
+    for inputs too large to hold in memory several times over. The result cache is not used.
+    """
+    return format_each(tf_files, options, format_stream, "Formatting (streaming)")
+
+
+def format_mapped_files(tf_files: list, options: RunOptions) -> list:
+    """
+    Like format_batch, but reads every file through a memory map and writes each output as the original
+    bytes plus edits (see mapped.format_mapped), keeping line endings and untouched bytes exactly.
+    The result cache is not used.
+    """
+    return format_each(tf_files, options, format_mapped, "Formatting (mapped)")
+
+
+def format_each(tf_files: list, options: RunOptions, format_file, label: str) -> list:
+    """
+    Formats the files one at a time with `format_file` (streaming.format_stream or mapped.format_mapped),
+    which also collects the resources of the file when indexing, from the chunks it formats.
+    """
+    reports = []
+    for tf_file in tf_files:
+        try:
+            timings, metrics, written, resources = format_file(tf_file, output_folder_for(tf_file, options),
+                                                               options.stages, options.emit_intermediates,
+                                                               options.stream_chunk_bytes, options.profile,
+                                                               options.trace_memory, options.verify, options.index)
+        except Exception as error:
+            reports.append(failed_report(tf_file, error, options))
+            continue
+        name = display_name(tf_file, options)
+        report = FileReport(name, log=[f"{label}: {name}"], timings=timings, metrics=metrics)
+        targets = describe_targets(report, written)
+        for stage in options.stages:
+            report.log.append(f"✔ {stage.description}{targets.get(stage.name, '')} "
+                              f"({timings[stage.name] * 1000:.2f} ms)")
+        report.resources = resources
+        reports.append(report)
+    return reports
+
+
+def check_files(tf_files: list, options: RunOptions) -> list:
+    """
+    Check mode: reports which files formatting would change, without writing anything. Each file stops at
+    the first stage that changes it, unless `diff` is set, in which case a block-level diff is logged.
+    Cached results are used where available.
+    """
+    reports = {}
+    pending = []
+    for tf_file in tf_files:
+        try:
+            content = tf_file.read_text(encoding="utf-8")
+        except Exception as error:
+            reports[tf_file] = failed_report(tf_file, error, options)
+            continue
+        outputs = options.cache.get(content) if options.cache is not None else None
+        if outputs is not None and options.check_target in outputs:
+            changed = split_lines(outputs[options.check_target]) != split_lines(content)
+            reports[tf_file] = check_report(tf_file, content, "cached result" if changed else None,
+                                            outputs[options.check_target], options, cached=True)
+        else:
+            pending.append((tf_file, content))
+
+    try:
+        results = check_batch([content for _, content in pending], options.stages, options.check_target,
+                              keep_output=options.diff)
+    except Exception:
+        results = None
+    for index, (tf_file, content) in enumerate(pending):
+        try:
+            if results is None:
+                stage_name, formatted = check_batch([content], options.stages, options.check_target,
+                                                    keep_output=options.diff)[0]
+            else:
+                stage_name, formatted = results[index]
+            reports[tf_file] = check_report(tf_file, content, stage_name, formatted, options)
+        except Exception as error:
+            reports[tf_file] = failed_report(tf_file, error, options)
+    return [reports[tf_file] for tf_file in tf_files]
+
+
+def check_report(tf_file: Path, content: str, stage_name: Optional[str], formatted: Optional[str],
+                 options: RunOptions, cached: bool = False) -> FileReport:
+    name = display_name(tf_file, options)
+    report = FileReport(name, cached=cached, unformatted=stage_name is not None)
+    if stage_name is None:
+        report.log.append(f"✔ {name} is formatted")
+        return report
+    report.log.append(f"✘ {name} would be reformatted (first changed by {stage_name})")
+    if options.diff and formatted is not None:
+        report.log.append(block_diff(str(tf_file), content, formatted))
+    return report
+
+
+def failed_report(tf_file: Path, error: Exception, options: RunOptions) -> FileReport:
+    message = describe_error(error)
+    name = display_name(tf_file, options)
+    return FileReport(name, log=[f"Formatting: {name}", f"✘ {message}"], error=message)
@@ -1,23 +1,7 @@
 import re
 
-# Order of keys based on Sentinel GUI
-DESIRED_KEY_ORDER = [
-    "for_each",
-    "name",
-    "display_name",
-    "description",
-    "log_analytics_workspace_id",
-    "severity",
-    "tactics",
-    "query_frequency",
-    "query_period",
-    "query",
-    "enabled",
-    "suppression_duration",
-    "suppression_enabled",
-    "trigger_operator",
-    "trigger_threshold"
-]
+from ordering import header_resource_type, order_properties
+from output import write_if_changed
 
 def add_dash_to_heredocs(text: str) -> str:
     return re.sub(r'(<<)([A-Z]+)', r'\1-\2', text)
@@ -66,17 +50,11 @@ def format_block(block: str) -> str:
     max_key_len = max((len(k) for k in kv_lines), default=0)
     formatted_lines = []
 
-    for key in DESIRED_KEY_ORDER:
-        if key in kv_lines:
-            indent, k, v = kv_lines[key]
-            padding = ' ' * (max_key_len - len(k))
-            formatted_lines.append(f"{indent}{k}{padding} = {v}")
-
-    for key in kv_lines:
-        if key not in DESIRED_KEY_ORDER:
-            indent, k, v = kv_lines[key]
-            padding = ' ' * (max_key_len - len(k))
-            formatted_lines.append(f"{indent}{k}{padding} = {v}")
+    resource_type = next(filter(None, map(header_resource_type, lines)), "")
+    for key in order_properties(list(kv_lines), resource_type):
+        indent, k, v = kv_lines[key]
+        padding = ' ' * (max_key_len - len(k))
+        formatted_lines.append(f"{indent}{k}{padding} = {v}")
 
     formatted_lines.extend(other_lines)
 
@@ -94,10 +72,11 @@ def format_tf_file(filepath: str):
     formatted_blocks = [format_block(block) for block in blocks]
     formatted_content = '\n'.join(formatted_blocks)
 
-    with open(filepath, 'w') as f:
-        f.write(formatted_content)
+    if not write_if_changed(filepath, formatted_content):
+        print("✅ Already formatted, nothing to update.")
+        return
 
-    print("✅ Heredoc dash, GUI key order, and heredoc closing indentation updated.")
+    print("✅ Heredoc dash, key order, and heredoc closing indentation updated.")
 
 if __name__ == "__main__":
     format_tf_file("sentinel.tf")
@@ -0,0 +1,145 @@
+import gzip
+import heapq
+import json
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from .incremental import file_signature
+from .output import write_if_changed
+
+DEFAULT_SHARD_MANIFEST = ".tf-shards.json"
+
+
+def parse_shard(value: str) -> tuple:
+    """
+    "I/N" -> (I, N), for the I-th (1-based) of N shards.
+    """
+    index, separator, count = value.partition("/")
+    if not separator or not index.isdigit() or not count.isdigit() or not 1 <= int(index) <= int(count):
+        raise ValueError(f"expected I/N with 1 <= I <= N, got {value!r}")
+    return int(index), int(count)
+
+
+def default_bundle_path(index: int, count: int) -> Path:
+    return Path(f"shard-{index}-of-{count}.json.gz")
+
+
+def partition(sizes: dict, count: int) -> dict:
+    """
+    Assigns every path to one of `count` shards (0-based), balancing the total size per shard: the
+    largest remaining file always goes to the lightest shard. Ties are broken by path and shard number,
+    so the same input always gives the same partition.
+    """
+    shards = [(0, shard) for shard in range(count)]
+    assignment = {}
+    for path, size in sorted(sizes.items(), key=lambda item: (-item[1], item[0])):
+        total, shard = heapq.heappop(shards)
+        assignment[path] = shard
+        heapq.heappush(shards, (total + size, shard))
+    return assignment
+
+
+def load_partition(manifest_file: Path, count: int) -> Optional[dict]:
+    """
+    The path -> shard assignment stored in `manifest_file` for `count` shards; None if there is none.
+    """
+    try:
+        manifest = json.loads(Path(manifest_file).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if manifest.get("shards") != count:
+        return None
+    return dict((path, entry[0]) for path, entry in manifest["files"].items())
+
+
+def save_partition(manifest_file: Path, count: int, assignment: dict, sizes: dict):
+    files = dict((path, [shard, sizes[path]]) for path, shard in sorted(assignment.items()))
+    write_if_changed(manifest_file, json.dumps({"shards": count, "files": files}, indent=0, sort_keys=True))
+
+
+def select_shard(tf_files: list, index: int, count: int, manifest_file: Path = Path(DEFAULT_SHARD_MANIFEST)) -> list:
+    """
+    The files of shard `index` (1-based) of `count`. The partition is read from `manifest_file`, or computed
+    from the file sizes and saved there when the manifest is missing or was made for a different shard count.
+    Files the manifest does not know are spread by a hash of their path, so every shard process agrees on
+    the partition as long as they see the same manifest.
+    """
+    assignment = load_partition(manifest_file, count)
+    if assignment is None:
+        sizes = dict((str(tf_file), tf_file.stat().st_size) for tf_file in tf_files)
+        assignment = partition(sizes, count)
+        save_partition(manifest_file, count, assignment, sizes)
+    return [tf_file for tf_file in tf_files
+            if assignment.get(str(tf_file), zlib.crc32(str(tf_file).encode("utf-8")) % count) == index - 1]
+
+
+# FileReport fields kept in a bundle; the log is printed by the shard process itself, and the resources go
+# to the bundle's index entries
+BUNDLE_REPORT_FIELDS = ("name", "error", "timings", "cached", "block_hits", "block_misses", "outputs", "modified")
+
+
+def write_bundle(bundle_file: Path, index: int, count: int, reports: list, output_folder: Path,
+                 tf_files: list = ()):
+    """
+    Packs the reports of one shard and every file it wrote below `output_folder` into one gzipped JSON file.
+    When indexing, the resources of the shard's `tf_files` (in the order of `reports`) are packed as
+    resource index entries, which merge_bundles collects.
+    """
+    outputs = {}
+    for path in sorted(Path(output_folder).rglob("*")):
+        if path.is_file():
+            outputs[path.relative_to(output_folder).as_posix()] = path.read_bytes().decode("utf-8")
+    entries = {}
+    for tf_file, report in zip(tf_files, reports):
+        if report.resources is not None:
+            entries[str(tf_file)] = {"signature": file_signature(tf_file), "resources": report.resources}
+    bundle = {
+        "shard": index,
+        "shards": count,
+        "reports": [dict((name, getattr(report, name)) for name in BUNDLE_REPORT_FIELDS) for report in reports],
+        "outputs": outputs,
+        "index": entries,
+    }
+    with gzip.open(bundle_file, "wt", encoding="utf-8") as output:
+        json.dump(bundle, output, separators=(",", ":"))
+
+
+@dataclass
+class MergeResult:
+    reports: list = field(default_factory=list)
+    outputs: int = 0
+    modified: int = 0
+    missing: list = field(default_factory=list)
+    index: dict = field(default_factory=dict)
+
+
+def merge_bundles(bundle_files: list, output_folder: Path) -> MergeResult:
+    """
+    Writes the outputs of every shard bundle into `output_folder` (unchanged files are left alone) and
+    collects their reports and resource index entries. `missing` lists the shard numbers that no bundle
+    covered.
+    Raises ValueError for bundles of different shard counts or the same shard given twice.
+    """
+    result = MergeResult()
+    seen = set()
+    count = None
+    for bundle_file in bundle_files:
+        with gzip.open(bundle_file, "rt", encoding="utf-8") as bundle_input:
+            bundle = json.load(bundle_input)
+        if count is not None and bundle["shards"] != count:
+            raise ValueError(f"{bundle_file} is shard {bundle['shard']}/{bundle['shards']}, expected one of {count}")
+        if bundle["shard"] in seen:
+            raise ValueError(f"{bundle_file}: shard {bundle['shard']}/{bundle['shards']} given twice")
+        count = bundle["shards"]
+        seen.add(bundle["shard"])
+        for relative, content in bundle["outputs"].items():
+            path = Path(output_folder) / relative
+            path.parent.mkdir(parents=True, exist_ok=True)
+            result.outputs += 1
+            result.modified += write_if_changed(path, content)
+        result.reports.extend(bundle["reports"])
+        result.index.update(bundle.get("index", {}))
+    result.missing = [shard for shard in range(1, (count or 0) + 1) if shard not in seen]
+    return result
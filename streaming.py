@@ -0,0 +1,168 @@
+import os
+from pathlib import Path
+
+from .hcl_parser import CLOSING, OPENING, TOKEN_PATTERN, tokenize
+from .instrumentation import aggregate
+from .output import replace_if_changed, temporary_path
+from .pipeline import STAGES, run_pipeline_batch
+from .resource_index import index_content
+from .verify import verify_outputs
+
+# Upper bound on the source text formatted together (and so held in memory) in one go.
+# A single top-level block larger than this is still formatted as a whole.
+DEFAULT_STREAM_CHUNK_BYTES = 1024 * 1024
+
+
+class ChunkSplitter:
+    """
+    Incrementally cuts a stream of lines into independently formattable chunks: a chunk ends after
+    a line that closes a top-level block, and every blank line at the top level is a chunk of its own.
+    Strings, comments and heredocs are tokenized, so braces inside them do not affect nesting.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.heredoc_delimiter = None
+        self.in_block_comment = False
+
+    def feed(self, line: str) -> bool:
+        """
+        Consumes one line (without its newline); returns True if a chunk may end after it.
+        """
+        if self.heredoc_delimiter is not None:
+            if line.strip() == self.heredoc_delimiter:
+                self.heredoc_delimiter = None
+            return False
+
+        if self.in_block_comment:
+            comment_end = line.find("*/")
+            if comment_end == -1:
+                return False
+            self.in_block_comment = False
+            line = line[comment_end + 2:]
+
+        depth_before = self.depth
+        for token in tokenize(line + "\n"):
+            if token.kind in OPENING:
+                self.depth += 1
+            elif token.kind in CLOSING:
+                self.depth = max(self.depth - 1, 0)
+            elif token.kind == "heredoc":
+                self.heredoc_delimiter = TOKEN_PATTERN.match(token.text).group("delimiter")
+            elif token.kind == "comment" and token.text.startswith("/*") and not token.text.rstrip().endswith("*/"):
+                self.in_block_comment = True
+
+        if self.depth or self.heredoc_delimiter is not None or self.in_block_comment:
+            return False
+        return depth_before > 0 or not line.strip()
+
+
+def split_chunks(lines):
+    """
+    Yields chunk texts from an iterable of lines (without newlines); joining them with "\n" gives back the input.
+    """
+    splitter = ChunkSplitter()
+    pending = []
+    for line in lines:
+        if not line.strip() and not splitter.depth and splitter.heredoc_delimiter is None \
+                and not splitter.in_block_comment and pending:
+            # Blank line at the top level: close the chunk before it
+            yield "\n".join(pending)
+            pending = []
+        pending.append(line)
+        if splitter.feed(line):
+            yield "\n".join(pending)
+            pending = []
+    if pending:
+        yield "\n".join(pending)
+
+
+def read_chunks(tf_file: Path):
+    """
+    Yields the file as a sequence of chunk texts, reading it line by line.
+    """
+    with open(tf_file, encoding="utf-8") as source:
+        yield from split_chunks(line.rstrip("\n") for line in source)
+
+
+def ends_with_newline(tf_file: Path) -> bool:
+    with open(tf_file, "rb") as source:
+        if source.seek(0, os.SEEK_END) == 0:
+            return False
+        source.seek(-1, os.SEEK_END)
+        return source.read(1) == b"\n"
+
+
+def group_chunks(chunks, max_bytes: int = DEFAULT_STREAM_CHUNK_BYTES):
+    """
+    Packs consecutive chunks into groups of roughly `max_bytes`, so batch stages
+    (one `terraform fmt` process per group) are not run once per block.
+    """
+    group = []
+    size = 0
+    for chunk in chunks:
+        group.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            yield group
+            group = []
+            size = 0
+    if group:
+        yield group
+
+
+def format_stream(tf_file: Path, output_folder: Path, stages: list = STAGES, emit_intermediates: bool = False,
+                  max_bytes: int = DEFAULT_STREAM_CHUNK_BYTES, profile: bool = False, trace_memory: bool = False,
+                  verify: bool = False, index: bool = False):
+    """
+    Formats `tf_file` group by group and appends each formatted chunk to the output files as soon as it
+    is ready, so memory use is bounded by the largest block (or group), not by the file size.
+    The outputs are written to temporary files that only replace the targets if their content changed.
+    With `verify`, every chunk is checked by verify.verify_outputs and nothing is replaced if one fails.
+    With `index`, the resources of every chunk are collected (see resource_index.index_content).
+    Returns (per-stage timings, per-stage StageMetrics summed over all chunks, [(stage, output path, modified)],
+    the Resources of the file or None without `index`).
+    """
+    written_stages = [stage for stage in stages if stage.terminal or emit_intermediates]
+    paths = [output_folder / f"{stage.artifact_prefix}-{tf_file.name}" for stage in written_stages]
+    temporaries = [temporary_path(path) for path in paths]
+    outputs = [open(temporary, "w", encoding="utf-8") for temporary in temporaries]
+    timings = dict((stage.name, 0.0) for stage in stages)
+    metrics = {}
+    resources = [] if index else None
+    first = True
+    first_line = 0
+    # Whether the last chunk output of each stage ended with a line break (see block_memo.join_outputs)
+    ends = [False] * len(written_stages)
+    try:
+        for group in group_chunks(read_chunks(tf_file), max_bytes):
+            for chunk, result in zip(group, run_pipeline_batch(group, stages, emit_intermediates, profile,
+                                                               trace_memory)):
+                if verify:
+                    verify_outputs(chunk, result, stages)
+                if index:
+                    resources.extend(index_content(chunk, first_line))
+                first_line += chunk.count("\n") + 1
+                for position, (stage, output) in enumerate(zip(written_stages, outputs)):
+                    text = result.outputs[stage.name]
+                    ends[position] = text.endswith("\n")
+                    if not first:
+                        output.write("\n")
+                    output.write(text[:-1] if ends[position] else text)
+                for stage_name, elapsed in result.timings.items():
+                    timings[stage_name] += elapsed
+                if profile:
+                    metrics = aggregate({0: metrics, 1: result.metrics})
+                first = False
+    except BaseException:
+        for output, temporary in zip(outputs, temporaries):
+            output.close()
+            temporary.unlink()
+        raise
+    final_newline = ends_with_newline(tf_file)
+    for output, stage_ends in zip(outputs, ends):
+        if output.tell() and (final_newline or stage_ends):
+            output.write("\n")
+        output.close()
+    modified = [replace_if_changed(temporary, path) for temporary, path in zip(temporaries, paths)]
+    return timings, metrics, list(zip(written_stages, paths, modified)), resources
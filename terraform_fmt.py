@@ -1,9 +1,22 @@
+import difflib
 import subprocess
 import tempfile
 from pathlib import Path
 
+from .heredoc_fmt import align_heredoc_closing_delimited
+from .instrumentation import timed_subprocess
+from .native_fmt import format_hcl
 
-def terraform_fmt(content: str) -> str:
+# Number of files handed to a single `terraform fmt` process
+DEFAULT_CHUNK_SIZE = 500
+
+# "native" applies the `terraform fmt` rules in-process (see native_fmt.format_hcl);
+# "terraform" runs the real binary, e.g. to verify the native backend against it
+BACKENDS = ("native", "terraform")
+DEFAULT_BACKEND = "native"
+
+
+def terraform_fmt(content: str, backend: str = DEFAULT_BACKEND) -> str:
     """
     Takes Terraform code as a string, formats it using `terraform fmt`, and returns the formatted version.
     This is preferred for formatting a terraform file for the following reasons:
@@ -18,14 +31,58 @@ def terraform_fmt(content: str) -> str:
       4. the custom scripts needs constant maintanance
       5. its risky to use a custom script on prod files as it might make unintentional alterations 
     """
+    return terraform_fmt_batch([content], backend=backend)[0]
+
+
+def terraform_fmt_batch(contents: list, chunk_size: int = DEFAULT_CHUNK_SIZE, backend: str = DEFAULT_BACKEND,
+                        raw: bool = False) -> list:
+    """
+    Formats many Terraform documents with as few `terraform fmt` processes as possible.
+    All contents are staged into one scratch directory, split into sub-directories of at most
+    `chunk_size` files, and `terraform fmt` runs once per sub-directory. The formatted contents
+    are returned in the same order as `contents`.
+    `terraform fmt` re-indents the line a heredoc starts on but not its closing marker, so the markers are
+    aligned with that line afterwards; one pass then gives output that formats to itself. The native
+    backend aligns them while formatting, without parsing the output again. With `raw`, both backends
+    return the plain `terraform fmt` output instead.
+    """
+    if backend == "native":
+        return [format_hcl(content, align_closers=not raw) for content in contents]
+    if backend != "terraform":
+        raise ValueError(f"Unknown formatter backend: {backend}")
+
+    formatted = []
     with tempfile.TemporaryDirectory() as tmpdir:
-        tmpfile = Path(tmpdir) / "temp.tf"
+        for chunk_start in range(0, len(contents), chunk_size):
+            chunk_dir = Path(tmpdir) / f"chunk-{chunk_start // chunk_size:05d}"
+            chunk_dir.mkdir()
+
+            tmpfiles = []
+            for index, content in enumerate(contents[chunk_start:chunk_start + chunk_size]):
+                tmpfile = chunk_dir / f"{index:06d}.tf"
+                tmpfile.write_text(content, encoding="utf-8")
+                tmpfiles.append(tmpfile)
 
-        tmpfile.write_text(content, encoding="utf-8")
-        subprocess.run(
-            ["terraform", "fmt", str(tmpfile)], check=True, capture_output=True
-        )
+            with timed_subprocess():
+                subprocess.run(
+                    ["terraform", "fmt", str(chunk_dir)], check=True, capture_output=True
+                )
 
-        formatted = tmpfile.read_text(encoding="utf-8")
+            outputs = [tmpfile.read_text(encoding="utf-8") for tmpfile in tmpfiles]
+            formatted.extend(outputs if raw else [align_heredoc_closing_delimited(output) for output in outputs])
 
     return formatted
+
+
+def compare_backends(contents: list) -> list:
+    """
+    Formats every document with both backends and returns a unified diff (native vs terraform)
+    for each one, or an empty string where they agree. The raw `terraform fmt` outputs are compared,
+    before the heredoc closing markers are aligned, so the native backend is checked against the binary
+    itself.
+    """
+    native = terraform_fmt_batch(contents, backend="native", raw=True)
+    official = terraform_fmt_batch(contents, backend="terraform", raw=True)
+    return ["".join(difflib.unified_diff(expected.splitlines(keepends=True), actual.splitlines(keepends=True),
+                                         fromfile="terraform", tofile="native"))
+            for actual, expected in zip(native, official)]
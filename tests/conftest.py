@@ -0,0 +1,11 @@
+import sys
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# The formatter is a package of the repository root, imported here as `tfmt` whatever the checkout is called
+if "tfmt" not in sys.modules:
+    package = types.ModuleType("tfmt")
+    package.__path__ = [str(ROOT)]
+    sys.modules["tfmt"] = package
@@ -0,0 +1,13 @@
+# Storage for the logs
+resource "azurerm_storage_account" "logs" {
+name = "logs" # short name
+  location   = var.location   # region
+account_tier="Standard"
+  /* replication */
+  account_replication_type = "LRS"
+
+   tags = {
+  env = "prod" // environment
+    owner="team"
+  }
+}
@@ -0,0 +1,14 @@
+locals {
+  count = var.enabled ? 1 : 0
+  total = var.a + var.b * 2
+  name  = "${var.prefix}-${var.name}"
+  upper = [for s in var.list : upper(s)]
+  ids   = { for k, v in var.map : k => v.id }
+  first = element(var.list, 0)
+}
+
+resource "azurerm_resource_group" "main" {
+  for_each = toset(var.groups)
+  name     = each.value
+  location = var.location
+}
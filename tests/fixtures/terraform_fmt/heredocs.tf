@@ -0,0 +1,11 @@
+resource "azurerm_sentinel_alert_rule_scheduled" "rule" {
+  name = "rule"
+  query = <<-QUERY
+    SecurityEvent
+    | where EventID == 4625
+    QUERY
+description = <<EOT
+Failed logons.
+EOT
+    severity = "High"
+}
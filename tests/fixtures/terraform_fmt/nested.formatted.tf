@@ -0,0 +1,23 @@
+resource "azurerm_sentinel_alert_rule_scheduled" "rule" {
+  name = "rule"
+  tactics = [
+    "Persistence",
+    "PrivilegeEscalation",
+  ]
+  incident_configuration {
+    create_incident = true
+    grouping {
+      enabled                = false
+      lookback_duration      = "PT5H"
+      entity_matching_method = "AllEntities"
+    }
+  }
+  event_grouping {
+    aggregation_method = "SingleAlert"
+  }
+}
+
+variable "names" {
+  type    = list(string)
+  default = ["a", "b", "c"]
+}
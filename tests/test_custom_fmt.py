@@ -0,0 +1,31 @@
+from pathlib import Path
+
+from tfmt.custom_fmt import reorder_resource_properties
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_comments_and_blank_lines_move_with_the_next_attribute():
+    source = '''resource "azurerm_sentinel_alert_rule_scheduled" "r" {
+  query = "q"
+
+  # the rule's name
+  name = "n"
+  severity = "High"
+}
+'''
+    assert reorder_resource_properties(source) == '''resource "azurerm_sentinel_alert_rule_scheduled" "r" {
+  # the rule's name
+  name = "n"
+  severity = "High"
+
+  query = "q"
+}
+'''
+
+
+def test_blank_lines_are_not_gathered_at_the_end_of_a_block():
+    source = (ROOT / "sentinel.tf").read_text(encoding="utf-8")
+    reordered = reorder_resource_properties(source)
+    assert "}\n\n\n}" not in reordered
+    assert sorted(reordered.splitlines()) == sorted(source.splitlines())
@@ -0,0 +1,73 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from tfmt.document import Document
+from tfmt.native_fmt import format_hcl
+from tfmt.terraform_fmt import compare_backends, terraform_fmt_batch
+
+# Inputs `<name>.tf` with the output `terraform fmt` gives for them, `<name>.formatted.tf`; re-record the
+# outputs with `terraform fmt` when adding a fixture (test_fixtures_are_terraform_fmt_output checks them)
+FIXTURES = Path(__file__).parent / "fixtures" / "terraform_fmt"
+FIXTURE_NAMES = sorted(path.name[:-len(".tf")] for path in FIXTURES.glob("*.tf")
+                       if not path.name.endswith(".formatted.tf"))
+
+
+def read_fixture(name: str) -> tuple:
+    source = (FIXTURES / f"{name}.tf").read_bytes().decode("utf-8")
+    expected = (FIXTURES / f"{name}.formatted.tf").read_bytes().decode("utf-8")
+    return source, expected
+
+
+@pytest.mark.parametrize("name", FIXTURE_NAMES)
+def test_native_output_matches_terraform_fmt(name):
+    source, expected = read_fixture(name)
+    assert format_hcl(source).encode("utf-8") == expected.encode("utf-8")
+
+
+@pytest.mark.parametrize("name", FIXTURE_NAMES)
+def test_native_output_is_stable(name):
+    _, expected = read_fixture(name)
+    assert format_hcl(expected) == expected
+
+
+@pytest.mark.skipif(shutil.which("terraform") is None, reason="the terraform binary is not installed")
+def test_fixtures_are_terraform_fmt_output():
+    fixtures = [read_fixture(name) for name in FIXTURE_NAMES]
+    outputs = terraform_fmt_batch([source for source, _ in fixtures], backend="terraform", raw=True)
+    assert outputs == [expected for _, expected in fixtures]
+
+
+@pytest.mark.skipif(shutil.which("terraform") is None, reason="the terraform binary is not installed")
+def test_backends_agree():
+    sources = [read_fixture(name)[0] for name in FIXTURE_NAMES]
+    assert compare_backends(sources) == [""] * len(sources)
+    assert terraform_fmt_batch(sources, backend="native") == terraform_fmt_batch(sources, backend="terraform")
+
+
+def test_native_backend_aligns_heredoc_closers():
+    source, _ = read_fixture("heredocs")
+    raw = terraform_fmt_batch([source], backend="native", raw=True)[0]
+    aligned = terraform_fmt_batch([source], backend="native")[0]
+    assert "\n    QUERY\n" in raw
+    assert "\n  QUERY\n" in aligned and "\n  EOT\n" in aligned
+    assert aligned.replace("\n  QUERY\n", "\n    QUERY\n").replace("\n  EOT\n", "\nEOT\n") == raw
+
+
+@pytest.mark.parametrize("source, expected", [
+    ('a = "x"', 'a = "x"\n'),
+    ('a = "x"\n', 'a = "x"\n'),
+    ('a = "x"\n\n\n', 'a = "x"\n'),
+    ("", ""),
+    ("\n\n", ""),
+])
+def test_output_ends_with_one_newline(source, expected):
+    assert format_hcl(source) == expected
+
+
+@pytest.mark.parametrize("source", ['a = "x"\n', 'a = "x"', "", "\n"])
+def test_document_keeps_the_final_newline(source):
+    document = Document(source)
+    assert document.text() == source
+    assert document.copy().text() == source
@@ -0,0 +1,24 @@
+import os
+import stat
+
+from tfmt.output import NEW_FILE_MODE, write_if_changed
+
+
+def mode(path) -> int:
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_new_files_get_the_umask_mode(tmp_path):
+    path = tmp_path / "main.tf"
+    assert write_if_changed(path, 'a = "x"\n')
+    assert mode(path) == NEW_FILE_MODE
+
+
+def test_rewritten_files_keep_their_mode(tmp_path):
+    path = tmp_path / "main.tf"
+    path.write_text('a="x"\n')
+    os.chmod(path, 0o640)
+    assert write_if_changed(path, 'a = "x"\n')
+    assert mode(path) == 0o640
+    assert path.read_text() == 'a = "x"\n'
+    assert [entry.name for entry in tmp_path.iterdir()] == ["main.tf"]
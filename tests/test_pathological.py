@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from tfmt.hcl_parser import find_heredoc_spans, find_resource_spans
+from tfmt.pipeline import STAGES, run_pipeline_batch
+from tfmt.verify import verify_outputs
+
+# Inputs that made the old `resource ... {[^}]*}` and lazy DOTALL heredoc regexes backtrack, and the
+# recursive parser overflow the stack, built from `units` repetitions
+PATHOLOGICAL_INPUTS = {
+    "nested_blocks": lambda units: 'resource "t" "n" {\n' + "a {\n" * units + "}\n" * (units + 1),
+    "unclosed_resources": lambda units: 'resource "t" "n" {\n  x = 1\n' * units,
+    "unclosed_labels": lambda units: 'resource "t' * units + "\n",
+    "unterminated_heredocs": lambda units: 'resource "t" "n" {\n  query = <<EOT\n  { body\n' * units,
+    "braces_in_heredocs": lambda units: 'resource "t" "n" {\n  q = <<-EOT\n  }}}{{\n  EOT\n}\n' * units,
+    "heredoc_openers": lambda units: "x = <<" * units + "EOT\n",
+    "nested_interpolations": lambda units: 'x = ' + '"${' * units + "\n",
+}
+
+# Repetitions the span finders are timed at (and at 4x that), and those the whole pipeline formats; the
+# latter are deeper than the default recursion limit
+SPAN_UNITS = 2000
+PIPELINE_UNITS = 2000
+
+# Time allowed for the largest input, and the largest allowed growth of the span finders' running time when
+# the input grows 4x (16x would mean quadratic behaviour)
+TIME_LIMIT = 5.0
+MAX_GROWTH = 8.0
+
+# Largest allowed output size, relative to the input, once indentation (which grows with the nesting depth
+# of every line) is left out
+MAX_SIZE_RATIO = 2.0
+
+TERMINAL_STAGES = [stage.name for stage in STAGES if stage.terminal]
+
+
+def best_time(func, text: str, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def find_spans(text: str):
+    find_resource_spans(text)
+    find_heredoc_spans(text)
+
+
+def unindented_size(text: str) -> int:
+    return sum(len(line.lstrip()) for line in text.splitlines())
+
+
+@pytest.mark.parametrize("case", PATHOLOGICAL_INPUTS)
+def test_span_finders_are_linear(case):
+    build = PATHOLOGICAL_INPUTS[case]
+    small = best_time(find_spans, build(SPAN_UNITS))
+    large = best_time(find_spans, build(SPAN_UNITS * 4))
+    assert large <= TIME_LIMIT
+    assert large <= max(small, 1e-3) * MAX_GROWTH
+
+
+@pytest.mark.parametrize("case", PATHOLOGICAL_INPUTS)
+def test_pipeline_formats_pathological_input(case):
+    content = PATHOLOGICAL_INPUTS[case](PIPELINE_UNITS)
+    start = time.perf_counter()
+    result = run_pipeline_batch([content])[0]
+    assert time.perf_counter() - start <= TIME_LIMIT
+    verify_outputs(content, result)
+
+    for stage_name in TERMINAL_STAGES:
+        output = result.outputs[stage_name]
+        assert unindented_size(output) <= unindented_size(content) * MAX_SIZE_RATIO + 1
+        assert run_pipeline_batch([output])[0].outputs[stage_name] == output, f"{stage_name} is not idempotent"
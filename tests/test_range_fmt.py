@@ -0,0 +1,30 @@
+from tfmt.range_fmt import apply_edits, format_byte_range, format_line_range
+
+# "é" takes two bytes in UTF-8, so every byte offset after it is one more than the character offset
+SOURCE = '''# Politique de sécurité
+locals {
+  a = "x"
+}
+resource "tfe_policy" "p" {
+name="é"
+  enforce_mode   =   "advisory"
+}
+'''
+
+
+def test_edits_use_byte_offsets():
+    data = SOURCE.encode("utf-8")
+    start = data.index(b"name")
+    edits = format_byte_range(SOURCE, start, start + 1)
+    assert edits
+    for edit in edits:
+        assert edit.start_byte == len("\n".join(SOURCE.split("\n")[:edit.start_line]).encode("utf-8")) + 1
+        original = data[edit.start_byte:edit.end_byte].decode("utf-8")
+        assert original == "".join(line + "\n" for line in SOURCE.split("\n")[edit.start_line:edit.end_line])
+    assert apply_edits(SOURCE, edits) == SOURCE.replace('name="é"\n  enforce_mode   =   "advisory"',
+                                                        '  name         = "é"\n  enforce_mode = "advisory"')
+
+
+def test_byte_and_line_ranges_agree():
+    start = SOURCE.encode("utf-8").index(b"resource")
+    assert format_byte_range(SOURCE, start, start + 1) == format_line_range(SOURCE, 4, 5)
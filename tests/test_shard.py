@@ -0,0 +1,22 @@
+from tfmt.resource_index import Resource, ResourceIndex
+from tfmt.runner import FileReport
+from tfmt.shard import merge_bundles, write_bundle
+
+
+def test_bundles_carry_resource_index_entries(tmp_path):
+    tf_file = tmp_path / "main.tf"
+    tf_file.write_text('resource "t" "n" {\n  name = "x"\n}\n')
+    scratch = tmp_path / "scratch"
+    (scratch / "sub").mkdir(parents=True)
+    (scratch / "sub" / "formatted-official-main.tf").write_text("formatted\n")
+    resources = [Resource("t.n", 1, None, "x", None)]
+    report = FileReport("main.tf", outputs=1, modified=1, resources=resources)
+    bundle_file = tmp_path / "shard-1-of-1.json.gz"
+    write_bundle(bundle_file, 1, 1, [report], scratch, [tf_file])
+
+    merged = merge_bundles([bundle_file], tmp_path / "formatted")
+    assert (tmp_path / "formatted" / "sub" / "formatted-official-main.tf").read_text() == "formatted\n"
+    assert merged.reports[0]["outputs"] == 1 and merged.missing == []
+    index = ResourceIndex()
+    index.merge(merged.index)
+    assert index.find("name", "x") == [(str(tf_file), resources[0])]
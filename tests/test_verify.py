@@ -0,0 +1,36 @@
+import pytest
+
+from tfmt.verify import VerificationError, verify_equivalent, verify_text
+
+SOURCE = '''resource "x" "y" {
+  b = "two"
+  a = 1
+  query = <<-QUERY
+    T | where a == 1 | project b
+  QUERY
+}
+'''
+
+
+@pytest.mark.parametrize("formatted", [
+    SOURCE,
+    SOURCE.replace("  b = \"two\"\n  a = 1\n", "  a     = 1\n  b     = \"two\"\n"),
+    SOURCE.replace("T | where a == 1 | project b", "T\n    | where a == 1\n    | project b"),
+    SOURCE.replace("    T |", "      T |"),
+])
+def test_equivalent_outputs_are_accepted(formatted):
+    assert verify_equivalent(SOURCE, formatted) is None
+
+
+@pytest.mark.parametrize("formatted", [
+    SOURCE.replace("a = 1", "a = 2"),
+    SOURCE.replace('"two"', '"two "'),
+    SOURCE.replace("where a == 1", "where a==1 ").replace("a==1", "a=1"),
+    SOURCE.replace("project b", "projectb"),
+    SOURCE.replace("  a = 1\n", "  a = 1\n  # added\n"),
+    SOURCE.rstrip("}\n") + "\n",
+])
+def test_changed_outputs_are_rejected(formatted):
+    assert verify_equivalent(SOURCE, formatted) is not None
+    with pytest.raises(VerificationError):
+        verify_text(SOURCE, formatted, "test")
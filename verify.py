@@ -0,0 +1,226 @@
+import re
+from functools import lru_cache
+from typing import Optional
+
+from .hcl_parser import OPENING, tokenize
+from .pipeline import STAGES
+
+# Tokens of a heredoc body: the KQL tokens of kql_fmt.KQL_TOKEN (strings never span lines), any other
+# character on its own. Whitespace separates tokens and is not part of the key.
+HEREDOC_TOKEN = re.compile(r"""
+    //[^\n]*
+  | @"[^"\n]*" | @'[^'\n]*' | "(?:[^"\\\n]|\\.)*" | '(?:[^'\\\n]|\\.)*'
+  | [$%]\{
+  | ==|!=|=~|!~|<=|>=|<>|=>|[=<>,|()\[\]{}]
+  | !?[^\s"'(),\[\]{}|=<>!/$%]+
+  | \S
+""", re.VERBOSE)
+
+# Distinct heredocs whose keys are kept; the input's heredocs are compared against every terminal output
+HEREDOC_KEY_CACHE_SIZE = 1024
+
+
+class VerificationError(Exception):
+    """
+    A formatter output that is not equivalent to its input (see verify_equivalent).
+    """
+
+
+@lru_cache(maxsize=HEREDOC_KEY_CACHE_SIZE)
+def heredoc_key(text: str) -> str:
+    """
+    A heredoc reduced to what must survive formatting: its marker without the `-` of `<<-`, and its body as
+    tokens (see HEREDOC_TOKEN). Lines may be split or joined between tokens and the spacing around them may
+    change, as the KQL stage does, but no two tokens may merge and string literals must match exactly.
+    A comment still ends its line.
+    """
+    marker, _, body = text.partition("\n")
+    tokens = HEREDOC_TOKEN.findall(body)
+    if "//" in body:
+        tokens = [" ".join(token.split()) + "\n" if token.startswith("//") else token for token in tokens]
+    return marker.replace("<<-", "<<").rstrip() + "\n" + " ".join(tokens)
+
+
+def same_token(expected, actual) -> bool:
+    """
+    Whether two tokens whose texts differ are still equivalent: comments may differ in whitespace, heredocs
+    as described in heredoc_key; everything else must match exactly.
+    """
+    if expected.kind != actual.kind:
+        return False
+    if expected.kind == "comment":
+        return expected.text.split() == actual.text.split()
+    if expected.kind == "heredoc":
+        return heredoc_key(expected.text) == heredoc_key(actual.text)
+    return False
+
+
+def first_divergence(before: list, after: list) -> Optional[int]:
+    """
+    Index of the first position where two token sequences (statement ends are None) hold tokens that are
+    not equivalent; None if there is none and both have the same length. Only tokens whose texts differ
+    are looked at more closely, so heredocs left as they were are never re-tokenized.
+    """
+    for index, (expected, actual) in enumerate(zip(before, after)):
+        if expected is None or actual is None:
+            if expected is not actual:
+                return index
+        elif expected.text != actual.text and not same_token(expected, actual):
+            return index
+    return None if len(before) == len(after) else min(len(before), len(after))
+
+
+class Body:
+    """
+    Statements of one block body (or of the file) while canonicalize walks through it: attributes, which
+    may be reordered, and everything else (nested blocks, comments), whose relative order is kept.
+    """
+
+    def __init__(self, header: list):
+        self.header = header
+        self.statements = []  # (attribute name or None, tokens ending with None)
+        self.statement = []
+
+    def end_statement(self):
+        if not self.statement:
+            return
+        self.statement.append(None)
+        if len(self.statement) > 2 and self.statement[0].kind == "ident" and is_assignment(self.statement):
+            self.statements.append((self.statement[0].text, self.statement))
+        else:
+            self.statements.append((None, self.statement))
+        self.statement = []
+
+    def tokens(self, ordered: bool) -> list:
+        """
+        The canonical tokens of the body: the statements in source order if `ordered`, otherwise the
+        attributes sorted by name followed by the other statements.
+        """
+        if ordered:
+            statements = self.statements
+        else:
+            statements = sorted((item for item in self.statements if item[0] is not None), key=lambda item: item[0])
+            statements += [item for item in self.statements if item[0] is None]
+        flat = []
+        for _, statement in statements:
+            flat.extend(statement)
+        return flat
+
+
+def is_assignment(statement: list) -> bool:
+    return len(statement) > 1 and statement[1] is not None and statement[1].text == "="
+
+
+def canonicalize(tokens: list) -> list:
+    """
+    Canonical token sequence of HCL source (from hcl_parser.tokenize) in one pass over its tokens:
+    whitespace and blank lines are dropped, and the attributes of every block body are sorted by name, so
+    two sources that differ only in layout or attribute order give equivalent sequences (see
+    first_divergence). Top-level statements keep their order. Newlines only separate statements (None in
+    the result); inside brackets and expressions they are ignored.
+    """
+    bodies = [Body([])]
+    depth = 0  # brackets open inside the current statement
+    for token in tokens:
+        body = bodies[-1]
+        kind = token.kind
+        if kind == "newline":
+            if depth == 0:
+                body.end_statement()
+            continue
+        if kind == "lbrace" and depth == 0 and not is_assignment(body.statement):
+            body.statement.append(token)
+            bodies.append(Body(body.statement))
+            body.statement = []
+            continue
+        if kind == "rbrace" and depth == 0 and len(bodies) > 1:
+            body.end_statement()
+            bodies.pop()
+            bodies[-1].statement = body.header + body.tokens(ordered=False) + [token]
+            continue
+        if kind in OPENING:
+            depth += 1
+        elif kind in OPENING.values():
+            depth = max(depth - 1, 0)
+        body.statement.append(token)
+
+    # Unbalanced input: close whatever is still open
+    while len(bodies) > 1:
+        body = bodies.pop()
+        body.end_statement()
+        bodies[-1].statement = body.header + body.tokens(ordered=False)
+    bodies[0].end_statement()
+    return bodies[0].tokens(ordered=True)
+
+
+def describe_token(text: str, tokens: list, index: int) -> str:
+    if index >= len(tokens):
+        return "end of file"
+    token = tokens[index]
+    if token is None:
+        return "end of statement"
+    column = token.start - text.rfind("\n", 0, token.start)
+    snippet = token.text if len(token.text) <= 40 else token.text[:37] + "..."
+    return f"{snippet!r} at line {token.line + 1}, column {column}"
+
+
+def describe_divergence(original: str, before: list, formatted: str, after: list) -> Optional[str]:
+    """
+    None if the canonical sequences `before` (of `original`) and `after` (of `formatted`) are equivalent,
+    otherwise a description of the first divergent token.
+    """
+    index = first_divergence(before, after)
+    if index is None:
+        return None
+    return f"input has {describe_token(original, before, index)}, output has {describe_token(formatted, after, index)}"
+
+
+def verify_equivalent(original: str, formatted: str) -> Optional[str]:
+    """
+    Checks that `formatted` differs from `original` only in whitespace, attribute order within a block
+    and heredoc indentation. Returns None if so, otherwise a description of the first divergent token.
+    Sources whose token streams already match are not canonicalized.
+    """
+    if formatted == original:
+        return None
+    before = tokenize(original)
+    after = tokenize(formatted)
+    if first_divergence(before, after) is None:
+        return None
+    return describe_divergence(original, canonicalize(before), formatted, canonicalize(after))
+
+
+def verify_text(original: str, formatted: str, label: str):
+    """
+    Raises VerificationError if `formatted` is not equivalent to `original` (see verify_equivalent);
+    `label` names what produced it.
+    """
+    divergence = verify_equivalent(original, formatted)
+    if divergence is not None:
+        raise VerificationError(f"{label} output is not equivalent to the input: {divergence}")
+
+
+def verify_outputs(content: str, result, stages: list = STAGES):
+    """
+    Verifies every terminal output of a PipelineResult against `content`; raises VerificationError naming
+    the stage and the first divergent token. `content` is tokenized and canonicalized once for all outputs,
+    and an output whose token stream matches one already verified (or the input) is accepted without
+    being canonicalized: the terminal outputs usually differ from each other in whitespace only.
+    """
+    original = tokenize(content)
+    canonical = None
+    verified = [original]
+    for stage in stages:
+        if not stage.terminal or stage.name not in result.outputs:
+            continue
+        output = result.outputs[stage.name]
+        if output == content:
+            continue
+        tokens = tokenize(output)
+        if all(first_divergence(known, tokens) is not None for known in reversed(verified)):
+            if canonical is None:
+                canonical = canonicalize(original)
+            divergence = describe_divergence(content, canonical, output, canonicalize(tokens))
+            if divergence is not None:
+                raise VerificationError(f"{stage.name} output is not equivalent to the input: {divergence}")
+        verified.append(tokens)